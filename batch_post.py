@@ -0,0 +1,188 @@
+"""Post-processors that run once on a whole extracted column.
+
+Use them as `ItemField.batch_post`. Each one takes the list of values of a field (for
+every row of an `Item`) and returns a sequence of the same length. The text work is
+done with one regex pass over the joined column instead of one call per value, and
+the dates and numbers are converted by NumPy in a single call.
+
+NumPy is only imported when `parse_iso_datetimes` or `parse_numbers` is used.
+"""
+from __future__ import annotations
+from typing import *
+import re
+
+
+# separator used to join a column into one string, values containing it are not supported
+SEP = '\x1f'
+
+_tz_suffix = re.compile(r'(?<=\d\d:\d\d)((?::\d\d)?(?:\.\d+)?)(?:Z|[+-]\d\d(?::?\d\d)?)(?=' + SEP + ')')
+_spaces = re.compile(r'[^\S' + SEP + r']+')
+_spaces_around_sep = re.compile(r' ?' + SEP + ' ?')
+_empty = re.compile(SEP + '(?=' + SEP + ')')
+
+
+def _join(values: Iterable) -> str:
+    # wrapped in separators so that every value is followed by one
+    return SEP + SEP.join('' if v is None else v for v in values) + SEP
+
+
+def _split(joined: str) -> list[str]:
+    return joined[1:-1].split(SEP)
+
+
+def _fill_empty(joined: str, value: str) -> str:
+    return _empty.sub(SEP + value, joined)
+
+
+def normalize_whitespace(values: Sequence[str]) -> list[str]:
+    """Collapse runs of whitespace to a single space and strip every value."""
+    if not len(values):
+        return []
+    joined = _spaces.sub(' ', _join(values))
+    return _split(_spaces_around_sep.sub(SEP, joined))
+
+
+# a single character that is not the separator
+_NOT_SEP = '(?:(?!' + SEP + '){})'
+
+
+def _class_end(pattern: str, i: int) -> int:
+    # the index after the `]` closing the character class opened at `pattern[i]`
+    j = i + 1
+    if j < len(pattern) and pattern[j] == '^':
+        j += 1
+    if j < len(pattern) and pattern[j] == ']':
+        j += 1
+    while j < len(pattern):
+        if pattern[j] == '\\':
+            j += 2
+        elif pattern[j] == ']':
+            return j + 1
+        else:
+            j += 1
+    return len(pattern)
+
+
+def exclude_sep(pattern: str, flags: int = 0) -> str:
+    """Rewrite `pattern` so that it can't match across values of a column joined with `SEP`.
+
+    `.`, character classes, `\\s`, `\\W` and `\\D` no longer match `SEP`, and `^`, `$`,
+    `\\A` and `\\Z` match at the start and end of every value. The column must be joined
+    without separators around it, `SEP.join(values)`.
+    """
+    multiline = re.compile(pattern, flags).flags & re.MULTILINE
+    value_start = '(?:\\A|(?<=' + SEP + '))'
+    value_end = '(?:\\Z|(?=' + SEP + '))'
+    start = '(?:\\A|(?<=[' + SEP + '\n]))' if multiline else value_start
+    # like `$`, also before a newline that ends the value
+    end = '(?=[' + SEP + '\n]|\\Z)' if multiline else '(?=\n?(?:' + SEP + '|\\Z))'
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            e = pattern[i:i + 2]
+            if e in ('\\s', '\\W', '\\D'):
+                out.append(_NOT_SEP.format(e))
+            elif e == '\\A':
+                out.append(value_start)
+            elif e == '\\Z':
+                out.append(value_end)
+            else:
+                out.append(e)
+            i += 2
+        elif c == '[':
+            j = _class_end(pattern, i)
+            out.append(_NOT_SEP.format(pattern[i:j]))
+            i = j
+        elif c == '.':
+            out.append(_NOT_SEP.format('.'))
+            i += 1
+        elif c == '^':
+            out.append(start)
+            i += 1
+        elif c == '$':
+            out.append(end)
+            i += 1
+        elif pattern.startswith('(?#', i):
+            j = pattern.find(')', i)
+            j = len(pattern) if j == -1 else j + 1
+            out.append(pattern[i:j])
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out)
+
+
+def regex_replace(pattern: Union[str, re.Pattern], repl: str = '', flags: int = 0) -> Callable[[Sequence[str]], list[str]]:
+    """Make a processor that runs `re.sub(pattern, repl)` on every value of a column.
+
+    The pattern runs once over the joined column, rewritten with `exclude_sep` so that
+    it matches within values only. A `repl` that adds or removes values raises a
+    `ValueError`.
+    """
+    if isinstance(pattern, re.Pattern):
+        pattern, flags = pattern.pattern, pattern.flags
+    compiled = re.compile(exclude_sep(pattern, flags), flags)
+    def process(values):
+        if not len(values):
+            return []
+        # without the outer separators, which would be matched as values of their own
+        output = compiled.sub(repl, _join(values)[1:-1]).split(SEP)
+        if len(output) != len(values):
+            raise ValueError('regex_replace({!r}) changed the number of values from {} to {}'.format(
+                pattern, len(values), len(output)))
+        return output
+    return process
+
+
+def parse_iso_datetimes(values: Sequence[str], unit: str = 's'):
+    """Parse ISO 8601 strings into a NumPy `datetime64[unit]` array.
+
+    As `util.parse_iso_datetime`, the timezone is dropped without converting the time.
+    Empty and unparsable values become `NaT`.
+    """
+    import numpy as np
+    if not len(values):
+        return np.array([], dtype='datetime64[{}]'.format(unit))
+    parts = _split(_fill_empty(_tz_suffix.sub(r'\1', _join(values)), 'NaT'))
+    try:
+        return np.array(parts, dtype='datetime64[{}]'.format(unit))
+    except ValueError:
+        return np.array([_to_datetime64(p, unit) for p in parts], dtype='datetime64[{}]'.format(unit))
+
+
+def _to_datetime64(value: str, unit: str):
+    import numpy as np
+    try:
+        return np.datetime64(value, unit)
+    except ValueError:
+        return np.datetime64('NaT', unit)
+
+
+def parse_numbers(values: Sequence[str], decimal: str = '.', dtype: str = 'float64'):
+    """Parse numbers and prices such as `'$1,234.50'` or `'1.234,50 €'` into a NumPy array.
+
+    Everything except digits, the `decimal` mark and a minus sign is dropped. Empty and
+    unparsable values become NaN.
+    """
+    import numpy as np
+    if not len(values):
+        return np.array([], dtype=dtype)
+    joined = _join(values)
+    if decimal != '.':
+        joined = joined.replace('.', '').replace(decimal, '.')
+    joined = re.sub(r'[^\d.\-' + SEP + ']', '', joined)
+    parts = _split(_fill_empty(joined, 'nan'))
+    try:
+        return np.array(parts, dtype=dtype)
+    except ValueError:
+        return np.array([_to_float(p) for p in parts], dtype=dtype)
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
@@ -0,0 +1,106 @@
+"""Memory and header lookup benchmark for the HAR parser on a synthetic HAR.
+
+Usage: python -m scraping_tools.benchmarks.har_memory [entry_count]
+"""
+import gc
+import json
+import sys
+import timeit
+import tracemalloc
+from scraping_tools.har.har_parser import EntryList
+
+
+REQUEST_HEADERS = [
+    ':method', ':authority', ':scheme', ':path', 'accept', 'accept-encoding', 'accept-language',
+    'cookie', 'referer', 'sec-ch-ua', 'sec-fetch-mode', 'user-agent',
+]
+
+RESPONSE_HEADERS = [
+    'cache-control', 'content-encoding', 'Content-Type', 'date', 'etag', 'expires', 'last-modified',
+    'server', 'set-cookie', 'set-cookie', 'strict-transport-security', 'vary', 'x-cache',
+    'x-content-type-options', 'x-frame-options',
+]
+
+
+def make_entry(i: int) -> dict:
+    url = 'https://www.example.com/api/items/{}?page={}'.format(i, i % 50)
+    return {
+        '_initiator': {'type': 'script'},
+        '_priority': 'High',
+        '_resourceType': 'fetch' if i % 3 else 'document',
+        'cache': {},
+        'request': {
+            'method': 'GET',
+            'url': url,
+            'httpVersion': 'http/2.0',
+            'headers': [{'name': n, 'value': '{}-{}'.format(n, i % 100)} for n in REQUEST_HEADERS],
+            'queryString': [{'name': 'page', 'value': str(i % 50)}],
+            'cookies': [],
+            'headersSize': -1,
+            'bodySize': 0,
+        },
+        'response': {
+            'status': 200,
+            'statusText': '',
+            'httpVersion': 'http/2.0',
+            'headers': [
+                {'name': n, 'value': 'application/json' if n == 'Content-Type' else '{}-{}'.format(n, i % 100)}
+                for n in RESPONSE_HEADERS
+            ],
+            'content': {'size': 1024, 'mimeType': 'application/json'},
+            'redirectURL': '',
+            'headersSize': -1,
+            'bodySize': 1024,
+            '_transferSize': 1200,
+            'cookies': [],
+            '_error': None,
+        },
+        'serverIPAddress': '93.184.216.34',
+        'startedDateTime': '2022-03-28T10:00:00.000Z',
+        'time': 12.5,
+        'timings': {'blocked': 0.5, 'dns': -1, 'ssl': -1, 'connect': -1, 'send': 0.1, 'wait': 11.0, 'receive': 0.9},
+    }
+
+
+def make_har_text(n: int) -> str:
+    return json.dumps({'log': {'entries': [make_entry(i) for i in range(n)]}})
+
+
+def measure(n: int = 100_000) -> dict:
+    text = make_har_text(n)
+
+    gc.collect()
+    tracemalloc.start()
+    entries = json.loads(text)['log']['entries']
+    gc.collect()
+    raw_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del entries
+
+    gc.collect()
+    tracemalloc.start()
+    entries = EntryList(json.loads(text)['log']['entries'])
+    gc.collect()
+    parsed_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    lookup = timeit.timeit(lambda: [e for e in entries if e.is_response_json()], number=1)
+    filtering = timeit.timeit(lambda: [list(e.request.headers.filter_bording()) for e in entries], number=1)
+
+    return {
+        'entries': n,
+        'raw_bytes_per_entry': raw_bytes / n,
+        'parsed_bytes_per_entry': parsed_bytes / n,
+        'content_type_lookup_s': lookup,
+        'filter_bording_s': filtering,
+    }
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    r = measure(n)
+    print("Entries: {}".format(r['entries']))
+    print("Raw HAR dicts: {:.0f} B/entry".format(r['raw_bytes_per_entry']))
+    print("EntryList:     {:.0f} B/entry".format(r['parsed_bytes_per_entry']))
+    print("is_response_json over all entries: {:.3f} s".format(r['content_type_lookup_s']))
+    print("filter_bording over all entries:   {:.3f} s".format(r['filter_bording_s']))
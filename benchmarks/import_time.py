@@ -0,0 +1,69 @@
+"""Import time benchmark based on `python -X importtime`.
+
+Imports each module in a fresh interpreter, reports its cumulative import time and the
+heavy dependencies that were loaded eagerly.
+
+Usage: python -m scraping_tools.benchmarks.import_time [--output result.json] [module ...]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+
+MODULES = [
+    'scraping_tools',
+    'scraping_tools.util',
+    'scraping_tools.scraper',
+    'scraping_tools.item_extractor',
+    'scraping_tools.har.har_parser',
+]
+
+# dependencies that should only be loaded when a feature using them is first used
+HEAVY = ['bs4', 'lxml', 'httpx', 'requests', 'dateutil', 'pickle', 'numpy', 'pyperclip']
+
+
+def measure(module: str, repeat: int = 5) -> dict:
+    code = 'import sys, {0}; print(",".join(sorted(sys.modules)))'.format(module)
+    times = []
+    for _ in range(repeat):
+        p = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+        if p.returncode != 0:
+            raise RuntimeError("Failed to import {}:\n{}".format(module, p.stderr[-2000:]))
+        for line in p.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:'):
+                continue
+            parts = line[len('import time:'):].split('|')
+            if parts[-1].strip() == module:
+                times.append(int(parts[1]))
+    loaded = set(p.stdout.strip().split(','))
+    return {
+        'module': module,
+        'cumulative_us': min(times) if times else None,
+        'heavy_loaded': [h for h in HEAVY if h in loaded],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    results = []
+    for m in args.modules:
+        r = measure(m, args.repeat)
+        results.append(r)
+        print("{module:<32} {cumulative_us:>8} us  heavy: {heavy}".format(
+            heavy=', '.join(r['heavy_loaded']) or '-', **r))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+        print("Results saved to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
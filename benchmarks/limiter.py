@@ -0,0 +1,78 @@
+"""Simulated hosts for checking how `HostLimit` reacts to latency.
+
+ - jitter: a host that is never overloaded, with latency uniform between 8 and 20 ms.
+ The limit must not fall below where it started.
+ - overload: a host that serves every request in 10 ms, until it can only serve
+ `capacity` requests at a time and queues the rest. The limit must come down to near
+ the capacity and stay there, rather than creep back up.
+
+Each case keeps 200 requests waiting on the limit and runs 3000 of them. Times are
+scaled down 10x from a typical 80-200 ms host so the check takes a few seconds.
+
+Usage: python -m scraping_tools.benchmarks.limiter
+"""
+import asyncio
+import random
+import sys
+
+from scraping_tools.concurrency import HostLimit
+
+
+async def drive(limit: HostLimit, request, n: int = 3000, clients: int = 200):
+    left = n
+
+    async def client():
+        nonlocal left
+        while left > 0:
+            left -= 1
+            started = await limit.acquire()
+            try:
+                await request()
+            finally:
+                await limit.release(started)
+
+    await asyncio.gather(*[client() for _ in range(clients)])
+    return limit.telemetry()
+
+
+async def jitter(initial: int = 50) -> dict:
+    async def request():
+        await asyncio.sleep(random.uniform(0.008, 0.020))
+    return await drive(HostLimit(initial=initial), request)
+
+
+async def overload(initial: int = 50, capacity: int = 10, healthy: int = 1000) -> dict:
+    # the host serves everything at once for the first `healthy` requests, then only
+    # `capacity` at a time, like a backend that lost most of its workers
+    workers = asyncio.Semaphore(capacity)
+    served = 0
+
+    async def request():
+        nonlocal served
+        served += 1
+        if served <= healthy:
+            await asyncio.sleep(0.010)
+            return
+        async with workers:
+            await asyncio.sleep(0.010)
+    return await drive(HostLimit(initial=initial), request)
+
+
+def check() -> bool:
+    ok = True
+    r = asyncio.run(jitter())
+    print('jitter:   limit {limit}, decreases {decreases}, p50 {p50:.4f}, p99 {p99:.4f}'.format(**r))
+    if r['limit'] < 50:
+        print('  FAILED: the limit fell under jitter alone')
+        ok = False
+    r = asyncio.run(overload())
+    print('overload: limit {limit}, decreases {decreases}, p50 {p50:.4f}, p99 {p99:.4f}'.format(**r))
+    # AIMD saws between the capacity and where queueing doubles the latency
+    if r['decreases'] == 0 or r['limit'] > 2.5 * 10:
+        print('  FAILED: the limit did not come down to near the capacity of 10')
+        ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check() else 1)
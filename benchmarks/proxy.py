@@ -0,0 +1,88 @@
+"""A local stand-in HTTP forward proxy, for testing `ProxyPool`.
+
+It relays plain http requests and can be made slow or broken:
+
+ - `latency` (float) seconds added to every request
+ - `fail_rate` (float) probability of closing the connection without an answer
+
+    proxy, url = start_proxy(latency=0.2)
+    pool = ProxyPool([url, ...])
+
+Usage: python -m scraping_tools.benchmarks.proxy [port] [latency] [fail_rate]
+"""
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+import http.client
+import random
+import sys
+import threading
+import time
+
+from scraping_tools.benchmarks.server import StandInServer
+
+
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-connection', 'proxy-authorization', 'transfer-encoding', 'te', 'upgrade'}
+
+
+class StandInProxyHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, with Nagle's algorithm on the second
+    # one waits for the delayed ack of the first on keep-alive connections (~40 ms)
+    disable_nagle_algorithm = True
+    latency = 0.0
+    fail_rate = 0.0
+
+    def relay(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.close_connection = True
+            return
+
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP}
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        try:
+            conn.request(self.command, url.path + ('?' + url.query if url.query else ''), body or None, headers)
+            res = conn.getresponse()
+            data = res.read()
+        except OSError:
+            self.send_error(502)
+            return
+        finally:
+            conn.close()
+
+        self.send_response(res.status)
+        for k, v in res.getheaders():
+            if k.lower() not in HOP_BY_HOP and k.lower() != 'content-length':
+                self.send_header(k, v)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = relay
+
+    def log_message(self, *args):
+        pass
+
+
+def start_proxy(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> tuple[StandInServer, str]:
+    """Start a proxy in a daemon thread. Returns the server and its url."""
+    handler = type('Handler', (StandInProxyHandler,), {'latency': latency, 'fail_rate': fail_rate})
+    server = StandInServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    fail_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, url = start_proxy(port, latency, fail_rate)
+    print("Proxying on {}".format(url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
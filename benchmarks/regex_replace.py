@@ -0,0 +1,62 @@
+"""Checks that `batch_post.regex_replace` gives the same result as `re.sub` on every value.
+
+The column processors run one regex over all values joined with a separator, so the
+patterns are rewritten to keep them within values. This compares them with a plain
+`re.sub` per value, for anchored patterns and patterns that could cross values.
+
+Usage: python -m scraping_tools.benchmarks.regex_replace
+"""
+import re
+import sys
+
+from scraping_tools.batch_post import regex_replace
+
+
+COLUMNS = [
+    ['ab', 'cd'],
+    ['ab'],
+    ['', 'x', ''],
+    ['  a  b ', ' c', 'd  '],
+    ['line 1\nline 2', 'one\n', '\n'],
+    ['$1,234.50', 'n/a', '€ 12'],
+]
+
+CASES = [
+    ('^', '> ', 0),
+    ('$', ';', 0),
+    (r'\A', '[', 0),
+    (r'\Z', ']', 0),
+    ('^', '> ', re.MULTILINE),
+    ('$', ';', re.MULTILINE),
+    (r'^\s+|\s+$', '', 0),
+    (r'\s+', ' ', 0),
+    (r'[^\d.]', '', 0),
+    (r'\W+', '_', 0),
+    ('.*', 'X', 0),
+    ('.+$', 'X', re.MULTILINE),
+    (r'\D*', '', 0),
+    (r'(\w)(\w)', r'\2\1', 0),
+    (r'\b', '|', 0),
+]
+
+
+def check() -> bool:
+    ok = True
+    for pattern, repl, flags in CASES:
+        process = regex_replace(pattern, repl, flags)
+        for column in COLUMNS:
+            expected = [re.sub(pattern, repl, v, flags=flags) for v in column]
+            try:
+                got = process(column)
+            except ValueError as e:
+                got = e
+            if got != expected:
+                ok = False
+                print('FAILED {!r} (flags {}) on {!r}:\n  expected {!r}\n  got      {!r}'.format(
+                    pattern, flags, column, expected, got))
+    print('{} patterns on {} columns: {}'.format(len(CASES), len(COLUMNS), 'ok' if ok else 'FAILED'))
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check() else 1)
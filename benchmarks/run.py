@@ -0,0 +1,245 @@
+"""Throughput benchmarks against the local stand-in server.
+
+Measures requests/sec, p50/p99 latency, CPU time per page and peak RSS of:
+
+ - `start_many` with `sync=True` and `sync=False` (gather)
+ - a registered scraper for each `pre_parse` mode
+ - `Item` extraction on listing pages, without the network
+
+Each case runs in a fresh process so that peak RSS is per case. Results are written as
+JSON and can be compared with an earlier run:
+
+    python -m scraping_tools.benchmarks.run --output new.json --compare old.json
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from datetime import datetime
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+from scraping_tools.benchmarks.server import start_server, listing_html
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def page_urls(base_url: str, opts: dict, kind: str = 'listing') -> list[str]:
+    return [
+        '{}/list?kind={}&page={}&items={}&latency={}&error={}'.format(
+            base_url, kind, i, opts['items'], opts['latency'], opts['error'])
+        for i in range(opts['pages'])
+    ]
+
+
+def make_engine(opts: dict):
+    import httpx
+    from scraping_tools.scraper import ScrapingEngineBase
+    return ScrapingEngineBase(client_kw={
+        'logs': [],
+        'limits': httpx.Limits(max_connections=opts['connections']),
+        'timeout': 30,
+    })
+
+
+async def start_many_case(base_url: str, opts: dict, sync: bool):
+    engine = make_engine(opts)
+    urls = page_urls(base_url, opts)
+    sender = await engine.start_many(lambda e: [{'method': 'GET', 'url': u} for u in urls], sync=sync).scrape()
+    res = sender.get()
+    await engine.aclose()
+    return len(res), [r.elapsed.total_seconds() for r in res]
+
+
+async def pre_parse_case(base_url: str, opts: dict, mode: str):
+    engine = make_engine(opts)
+    urls = page_urls(base_url, opts, kind='json' if mode == 'json' else 'listing')
+
+    def callback(r):
+        elapsed = r.get().elapsed.total_seconds()
+        r.pre_parse(mode)
+        return elapsed
+
+    @engine.register_scraper('page', callback=callback)
+    def page(engine, url):
+        return {'method': 'GET', 'url': url}
+
+    latencies = await asyncio.gather(*[page.scrape(u) for u in urls])
+    await engine.aclose()
+    return len(latencies), latencies
+
+
+def item_case(opts: dict, rows: bool):
+    import lxml.html
+    from scraping_tools.item_extractor import Item, ItemField, make_item_extractor
+
+    if rows:
+        item = Item(root_xpath='//div[@class="item"]', fields=[
+            ItemField('title', './a/text()', first=True),
+            ItemField('url', './a/@href', first=True),
+            ItemField('price', './span[@class="price"]/text()', first=True),
+            ItemField('date', './time/@datetime', first=True),
+        ])
+    else:
+        item = Item(fields=[
+            ItemField('title', '//div[@class="item"]/a/text()'),
+            ItemField('url', '//div[@class="item"]/a/@href'),
+            ItemField('price', '//span[@class="price"]/text()'),
+            ItemField('date', '//time/@datetime'),
+        ])
+    extractor = make_item_extractor(item)
+    trees = [lxml.html.fromstring(listing_html(opts['items'], i % 10)) for i in range(10)]
+
+    latencies = []
+    for i in range(opts['pages']):
+        start = time.perf_counter()
+        extractor(trees[i % 10])
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), latencies
+
+
+CASES = {
+    'start_many_sync': lambda u, o: asyncio.run(start_many_case(u, o, sync=True)),
+    'start_many_gather': lambda u, o: asyncio.run(start_many_case(u, o, sync=False)),
+    'pre_parse_none': lambda u, o: asyncio.run(pre_parse_case(u, o, '')),
+    'pre_parse_json': lambda u, o: asyncio.run(pre_parse_case(u, o, 'json')),
+    'pre_parse_lxml': lambda u, o: asyncio.run(pre_parse_case(u, o, 'lxml')),
+    'pre_parse_soup': lambda u, o: asyncio.run(pre_parse_case(u, o, 'soup')),
+    'item_columns': lambda u, o: item_case(o, rows=False),
+    'item_rows': lambda u, o: item_case(o, rows=True),
+}
+
+
+# modules each case imports on first use, imported before the timers start so that
+# one-off import time doesn't count as per-page time
+WARM_IMPORTS = {
+    'start_many_sync': ['httpx', 'scraping_tools.scraper'],
+    'start_many_gather': ['httpx', 'scraping_tools.scraper'],
+    'pre_parse_none': ['httpx', 'scraping_tools.scraper'],
+    'pre_parse_json': ['httpx', 'scraping_tools.scraper'],
+    'pre_parse_lxml': ['httpx', 'scraping_tools.scraper', 'lxml.html'],
+    'pre_parse_soup': ['httpx', 'scraping_tools.scraper', 'lxml.html', 'bs4', 'bs4.builder._lxml'],
+    'item_columns': ['lxml.html', 'scraping_tools.item_extractor'],
+    'item_rows': ['lxml.html', 'scraping_tools.item_extractor'],
+}
+
+
+def run_case(name: str, base_url: str, opts: dict) -> dict:
+    for m in WARM_IMPORTS.get(name, []):
+        importlib.import_module(m)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    pages, latencies = CASES[name](base_url, opts)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+    return {
+        'case': name,
+        'pages': pages,
+        'wall_s': wall,
+        'rps': pages / wall if wall else None,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'cpu_per_page_ms': cpu / pages * 1000 if pages else None,
+        'peak_rss_mb': peak_rss / 1024 ** 2,
+    }
+
+
+# metric -> whether a higher value is better
+METRICS = {
+    'rps': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'cpu_per_page_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def compare(old: dict, new: dict, threshold: float = 0.1) -> list[str]:
+    """Print the relative change of every metric and return the regressions."""
+    old_results = {r['case']: r for r in old['results']}
+    regressions = []
+    for r in new['results']:
+        o = old_results.get(r['case'])
+        if not o:
+            continue
+        for m, higher_is_better in METRICS.items():
+            if not o.get(m) or r.get(m) is None:
+                continue
+            change = (r[m] - o[m]) / o[m]
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = 'REGRESSION'
+                regressions.append('{} {}'.format(r['case'], m))
+            print("{:<20} {:<16} {:>10.2f} -> {:>10.2f} {:>+7.1%} {}".format(r['case'], m, o[m], r[m], change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='*', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--items', type=int, default=50, help='items per listing page')
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency in seconds')
+    parser.add_argument('--error', type=float, default=0.0, help='server error rate')
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--output', default='benchmarks/results/{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+    parser.add_argument('--compare', help='an earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args(argv)
+
+    opts = {k: getattr(args, k) for k in ('pages', 'items', 'latency', 'error', 'connections')}
+    server, base_url = start_server()
+
+    results = []
+    try:
+        for name in args.cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                r = pool.submit(run_case, name, base_url, opts).result()
+            results.append(r)
+            print("{case:<20} {rps:>9.1f} req/s  p50 {p50_ms:>8.2f} ms  p99 {p99_ms:>8.2f} ms  "
+                  "cpu {cpu_per_page_ms:>7.3f} ms/page  rss {peak_rss_mb:>7.1f} MB".format(**r))
+    finally:
+        server.shutdown()
+
+    output = {
+        'meta': {
+            'time': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            **opts,
+        },
+        'results': results,
+    }
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print("Results saved to {}".format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), output, args.threshold)
+        if regressions:
+            print("Regressions: {}".format(', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""A local stand-in HTTP server for benchmarks.
+
+Every response is controlled by query parameters:
+
+ - `latency` (float) seconds to wait before responding
+ - `size` (int) payload size in bytes for `kind=blob`
+ - `error` (float) probability of answering with a 503
+ - `kind` (str) `listing` (HTML listing page), `json` (the same items as JSON) or `blob`
+ - `items` (int) number of items on a listing/json page
+
+Usage: python -m scraping_tools.benchmarks.server [port]
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import json
+import random
+import sys
+import threading
+import time
+
+
+def listing_items(n: int, page: int = 0) -> list[dict]:
+    return [
+        {
+            'id': page * n + i,
+            'title': '  Item   number {}  \n'.format(page * n + i),
+            'url': '/item/{}'.format(page * n + i),
+            'price': '${:,.2f}'.format(1000 + (page * n + i) * 1.25),
+            'date': '2022-03-{:02d}T{:02d}:30:00Z'.format(i % 28 + 1, i % 24),
+        }
+        for i in range(n)
+    ]
+
+
+def listing_html(n: int, page: int = 0) -> str:
+    rows = ''.join(
+        '<div class="item" data-id="{id}"><a class="title" href="{url}">{title}</a>'
+        '<span class="price">{price}</span><time datetime="{date}">{date}</time>'
+        '<p class="desc">Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p></div>\n'.format(**i)
+        for i in listing_items(n, page)
+    )
+    return (
+        '<!DOCTYPE html><html><head><title>Listing {page}</title>'
+        '<script>var pageData = {data};</script></head>'
+        '<body><div id="listing">\n{rows}</div>'
+        '<a class="next" href="?page={next}">next</a></body></html>'
+    ).format(page=page, next=page + 1, rows=rows, data=json.dumps({'page': page, 'count': n}))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, with Nagle's algorithm on the second
+    # one waits for the delayed ack of the first on keep-alive connections (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        latency = float(q.get('latency', 0))
+        if latency:
+            time.sleep(latency)
+
+        if random.random() < float(q.get('error', 0)):
+            return self.respond(503, b'Service Unavailable', 'text/plain')
+
+        kind = q.get('kind', 'listing')
+        items = int(q.get('items', 50))
+        page = int(q.get('page', 0))
+        if kind == 'listing':
+            self.respond(200, listing_html(items, page).encode(), 'text/html; charset=utf-8')
+        elif kind == 'json':
+            self.respond(200, json.dumps(listing_items(items, page)).encode(), 'application/json')
+        elif kind == 'blob':
+            self.respond(200, b'x' * int(q.get('size', 1024)), 'application/octet-stream')
+        else:
+            self.respond(404, b'Not Found', 'text/plain')
+
+    def respond(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_server(port: int = 0) -> tuple[StandInServer, str]:
+    """Start the server in a daemon thread. Returns the server and its base url."""
+    server = StandInServer(('127.0.0.1', port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server, url = start_server(port)
+    print("Serving on {}".format(url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import *
+from urllib.parse import urlsplit
+import asyncio
+import hashlib
+import os
+import uuid
+
+if TYPE_CHECKING:
+    from httpx import AsyncClient, Request, Response
+
+
+class BodyRejected(Exception):
+    """Raised when a response body breaks its `BodyPolicy`."""
+
+    def __init__(self, reason: str, response: Response):
+        super().__init__('{}: {}'.format(reason, response.url))
+        self.reason = reason
+        self.response = response
+
+
+
+
+@dataclass
+class BodyPolicy:
+    """Limits on how a response body is read.
+
+    Parameters:
+
+     - `max_size` (int) The maximum body size in bytes. A larger `content-length` is
+     rejected before the body is read, and reading stops as soon as more bytes arrive.
+     - `content_types` (list) Allowed content types, checked from the headers before the
+     body is read. A prefix like `'image/'` allows all image types.
+     - `download_to` (str | function) Stream the body to a file instead of memory. Either
+     a directory, in which case the file is named after a hash of the url and the last
+     part of the url path, or a method that takes in the response and returns the file
+     path. The body is written in `chunk_size` chunks, in a worker thread, to a `.part`
+     file of its own that is renamed when complete. `res.content` is then empty and
+     `res.extensions['download']` holds the path, size and hash of the file.
+     - `hash` (str) A `hashlib` algorithm computed over the body while it is streamed.
+     Downloads are always hashed, with blake2b by default, so that incremental crawls can
+     tell whether they changed.
+    """
+
+    max_size: int = None
+    content_types: list[str] = None
+    download_to: Union[str, Callable[[Response], str]] = None
+    hash: str = None
+    chunk_size: int = 64 * 1024
+
+    def check_headers(self, res: Response):
+        if self.content_types is not None:
+            ct = res.headers.get('content-type', '').split(';')[0].strip().lower()
+            if not any(ct == t or (t.endswith('/') and ct.startswith(t)) for t in self.content_types):
+                raise BodyRejected('content type {!r} not allowed'.format(ct), res)
+        if self.max_size is not None:
+            length = res.headers.get('content-length')
+            if length and length.isdigit() and int(length) > self.max_size:
+                raise BodyRejected('content length {} over {}'.format(length, self.max_size), res)
+
+    def download_path(self, res: Response) -> str:
+        if callable(self.download_to):
+            return self.download_to(res)
+        url = str(res.url)
+        # urls that only differ in the directory or query don't overwrite each other
+        key = hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+        name = os.path.basename(urlsplit(url).path) or 'index'
+        return os.path.join(self.download_to, '{}-{}'.format(key, name))
+
+    async def read(self, res: Response):
+        """Read the body of a streamed response according to the policy, then close it."""
+        try:
+            self.check_headers(res)
+            algorithm = self.hash or ('blake2b' if self.download_to is not None else None)
+            h = hashlib.new(algorithm) if algorithm else None
+            size = 0
+            if self.download_to is None:
+                chunks = []
+                async for chunk in res.aiter_bytes(self.chunk_size):
+                    size += len(chunk)
+                    if self.max_size is not None and size > self.max_size:
+                        raise BodyRejected('body over {} bytes'.format(self.max_size), res)
+                    if h:
+                        h.update(chunk)
+                    chunks.append(chunk)
+                # as Response.aread does
+                res._content = b''.join(chunks)
+            else:
+                path = self.download_path(res)
+                # unique per download, concurrent downloads of the same url don't mix
+                part = '{}.{}.part'.format(path, uuid.uuid4().hex[:12])
+                # file io runs in a worker thread so that it doesn't block the event loop
+                f = await asyncio.to_thread(open, part, 'wb')
+                try:
+                    try:
+                        async for chunk in res.aiter_bytes(self.chunk_size):
+                            size += len(chunk)
+                            if self.max_size is not None and size > self.max_size:
+                                raise BodyRejected('body over {} bytes'.format(self.max_size), res)
+                            if h:
+                                h.update(chunk)
+                            await asyncio.to_thread(f.write, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                    await asyncio.to_thread(os.replace, part, path)
+                except BaseException:
+                    if os.path.exists(part):
+                        os.remove(part)
+                    raise
+                res._content = b''
+                res.extensions['download'] = {'path': path, 'size': size}
+            if h:
+                res.extensions['hash'] = h.hexdigest()
+                if 'download' in res.extensions:
+                    res.extensions['download']['hash'] = res.extensions['hash']
+        finally:
+            await res.aclose()
+        return res
+
+
+async def send_with_policy(client: AsyncClient, req: Request, policy: BodyPolicy = None) -> Response:
+    if policy is None:
+        return await client.send(req)
+    res = await client.send(req, stream=True)
+    return await policy.read(res)
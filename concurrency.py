@@ -0,0 +1,185 @@
+from __future__ import annotations
+from collections import deque
+from typing import *
+from urllib.parse import urlsplit
+import asyncio
+import time
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+class HostLimit():
+    """The in-flight request limit of a single host, adjusted with AIMD.
+
+    The limit grows by `increase / limit` on every successful request while the limit is
+    being used (about +`increase` per round trip), and is multiplied by `decrease` when a
+    request fails, times out or gets an error status, or when the recent latency rises
+    above `latency_tolerance` times the baseline latency. Only requests started after the
+    last decrease can trigger another one, so a burst of failures from the same window
+    counts once.
+
+    The recent latency is a moving average over about `short_window` requests, and the
+    baseline is the lowest recent latency seen in the last `long_window` requests. Single
+    slow responses from normal jitter barely move the average, while queueing at an
+    overloaded host keeps raising it until the limit comes down. The baseline follows a
+    host that got slower for good once the window has passed. Latency is ignored for the
+    first `short_window` requests.
+    """
+
+    def __init__(
+        self,
+        initial: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        short_window: int = 10,
+        long_window: int = 500,
+        window: int = 200,
+        log_size: int = 100,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.short_window = short_window
+        self.long_window = long_window
+        self.short_alpha = 2 / (short_window + 1)
+
+        self.inflight = 0
+        self.successes = 0
+        self.errors = 0
+        self.increases = 0
+        self.decreases = 0
+        self.short_latency = None
+        # (sample number, short latency) pairs with increasing latencies, the first is
+        # the minimum over the long window
+        self._baseline = deque()
+        self.latencies = deque(maxlen=window)
+        self.adjustments = deque(maxlen=log_size)
+        self.last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    def baseline(self) -> float:
+        return self._baseline[0][1] if self._baseline else None
+
+    def _latency_ratio(self, latency: float) -> float:
+        """Update the moving average and baseline, return the recent latency over the baseline."""
+        if self.short_latency is None:
+            self.short_latency = latency
+        else:
+            self.short_latency += self.short_alpha * (latency - self.short_latency)
+        n = self.successes
+        if n <= self.short_window:
+            # the average is still dominated by the first few samples
+            return 1.0
+        b = self._baseline
+        while b and b[-1][1] >= self.short_latency:
+            b.pop()
+        b.append((n, self.short_latency))
+        while b[0][0] <= n - self.long_window:
+            b.popleft()
+        return self.short_latency / b[0][1] if b[0][1] > 0 else 1.0
+
+    async def acquire(self) -> float:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+        return time.perf_counter()
+
+    async def release(self, started: float, error: bool = False):
+        latency = time.perf_counter() - started
+        old = self.limit
+        self.inflight -= 1
+
+        if error:
+            self.errors += 1
+            reason = 'error'
+        else:
+            self.successes += 1
+            self.latencies.append(latency)
+            reason = 'latency' if self._latency_ratio(latency) > self.latency_tolerance else None
+
+        if reason:
+            if started > self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.last_decrease = time.perf_counter()
+        elif self.inflight + 1 >= int(self.limit) / 2:
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            reason = 'success'
+
+        if int(self.limit) != int(old):
+            if self.limit > old:
+                self.increases += 1
+            else:
+                self.decreases += 1
+            self.adjustments.append((time.time(), int(old), int(self.limit), reason))
+
+        async with self._cond:
+            self._cond.notify_all()
+
+    async def discard(self):
+        """Free the slot of a request that was cancelled, without counting it as a sample."""
+        self.inflight -= 1
+        async with self._cond:
+            self._cond.notify_all()
+
+    def telemetry(self) -> dict:
+        l = list(self.latencies)
+        return {
+            'limit': int(self.limit),
+            'inflight': self.inflight,
+            'successes': self.successes,
+            'errors': self.errors,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'short_latency': self.short_latency,
+            'baseline_latency': self.baseline(),
+            'p50': percentile(l, 50),
+            'p90': percentile(l, 90),
+            'p99': percentile(l, 99),
+            'adjustments': list(self.adjustments),
+        }
+
+
+
+
+class AdaptiveLimiter():
+    """Per-host adaptive concurrency control for `send_request_with_params`.
+
+    Parameters:
+
+     - `error_statuses` (set) Response status codes that are treated as overload signals.
+     Defaults to 429 and all 5xx.
+     - any other keyword arguments are passed to the `HostLimit` of each host.
+    """
+
+    def __init__(self, error_statuses: Container[int] = None, **host_kw):
+        self.error_statuses = error_statuses
+        self.host_kw = host_kw
+        self.hosts: dict[str, HostLimit] = {}
+
+    def get(self, host: str) -> HostLimit:
+        if host not in self.hosts:
+            self.hosts[host] = HostLimit(**self.host_kw)
+        return self.hosts[host]
+
+    def get_for_params(self, params: dict) -> HostLimit:
+        return self.get(urlsplit(str(params.get('url', ''))).netloc)
+
+    def is_error_status(self, status: int) -> bool:
+        if self.error_statuses is None:
+            return status == 429 or status >= 500
+        return status in self.error_statuses
+
+    def telemetry(self) -> dict[str, dict]:
+        return {h: l.telemetry() for h, l in self.hosts.items()}
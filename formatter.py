@@ -1,6 +1,5 @@
 import sys
 from rich import print
-import pyperclip
 
 
 def print_number_with_base(size, unit_size: int = 1024, unit: str = 'B', current: str = ''):
@@ -41,6 +40,7 @@ def format_header_string(header_string: str) -> dict:
         name, *value = c.split(': ')
         output[name] = '='.join(value)
     print(output)
+    import pyperclip
     pyperclip.copy(str(output))
     print("Copied to clipboard")
     return output
@@ -0,0 +1,180 @@
+from __future__ import annotations
+from typing import *
+from urllib.parse import urlsplit
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+
+class HostQueue():
+
+    def __init__(self, weight: float, delay: float):
+        self.weight = weight
+        self.delay = delay
+        self.waiters = []   # heap of (-priority, deadline, seq, future)
+        self.inflight = 0
+        self.next_allowed = 0.0
+        self.vtime = 0.0
+        self.dispatched = 0
+
+    def top(self):
+        # drop waiters that were cancelled while queued
+        while self.waiters and self.waiters[0][3].done():
+            heapq.heappop(self.waiters)
+        return self.waiters[0] if self.waiters else None
+
+
+
+
+class Frontier():
+    """Schedules the requests of all scrapers sharing an engine.
+
+    Every request waits in the queue of its host until the frontier lets it go. When a
+    slot among the `concurrency` in-flight requests is free, the next request is chosen as:
+
+     1. the request with the earliest deadline, if any deadline is within `urgency` seconds
+     2. otherwise the request with the highest priority
+     3. between hosts with equal priority, weighted fair queuing: every dispatch advances
+     the virtual time of its host by `1 / weight`, and the host furthest behind goes next
+
+    A host is only eligible `delay` seconds after its last request was sent (politeness),
+    and while it has less than `per_host` requests in flight.
+
+    Parameters:
+
+     - `concurrency` (int) The maximum number of in-flight requests for all hosts.
+     - `per_host` (int) The maximum number of in-flight requests per host.
+     - `delay` (float) Default politeness delay in seconds between requests to a host.
+     - `host_delays` (dict) Politeness delay per host, overriding `delay`.
+     - `host_weights` (dict) Fair share weight per host, default 1.
+     - `urgency` (float) Seconds before a deadline from which a request jumps the queue.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 20,
+        per_host: int = 10,
+        delay: float = 0.0,
+        host_delays: dict[str, float] = {},
+        host_weights: dict[str, float] = {},
+        urgency: float = 1.0,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.host_delays = host_delays
+        self.host_weights = host_weights
+        self.urgency = urgency
+
+        self.hosts: dict[str, HostQueue] = {}
+        self.inflight = 0
+        self.vtime = 0.0
+        self._seq = itertools.count()
+        self._timer = None
+
+    def host(self, name: str) -> HostQueue:
+        if name not in self.hosts:
+            self.hosts[name] = HostQueue(
+                self.host_weights.get(name, 1.0),
+                self.host_delays.get(name, self.delay)
+            )
+        return self.hosts[name]
+
+    async def acquire(self, host: str, priority: int = 0, deadline: float = None):
+        """Wait until a request to `host` may be sent. `deadline` is a `time.monotonic()` value."""
+        h = self.host(host)
+        if not h.waiters and h.inflight == 0:
+            # an idle host joins at the current virtual time instead of catching up
+            h.vtime = max(h.vtime, self.vtime)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(h.waiters, (-priority, deadline if deadline is not None else math.inf, next(self._seq), fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # dispatched just before being cancelled
+                self.release(host)
+            raise
+
+    def release(self, host: str):
+        self.inflight -= 1
+        self.hosts[host].inflight -= 1
+        self._dispatch()
+
+    def slot(self, url: str, priority: int = 0, deadline: float = None) -> _Slot:
+        return _Slot(self, urlsplit(str(url)).netloc, priority, deadline)
+
+    def _dispatch(self):
+        while self.inflight < self.concurrency:
+            now = time.monotonic()
+            best = None
+            best_key = None
+            wake_at = None
+            for h in self.hosts.values():
+                top = h.top()
+                if top is None or h.inflight >= self.per_host:
+                    continue
+                if h.next_allowed > now:
+                    wake_at = min(wake_at or h.next_allowed, h.next_allowed)
+                    continue
+                neg_priority, deadline, seq, _ = top
+                urgent = deadline - now <= self.urgency
+                key = (not urgent, deadline if urgent else 0, neg_priority, h.vtime, seq)
+                if best_key is None or key < best_key:
+                    best, best_key = h, key
+            if best is None:
+                self._schedule_wake(wake_at)
+                return
+            _, _, _, fut = heapq.heappop(best.waiters)
+            self.inflight += 1
+            best.inflight += 1
+            best.dispatched += 1
+            best.next_allowed = now + best.delay
+            self.vtime = best.vtime
+            best.vtime += 1.0 / best.weight
+            fut.set_result(None)
+
+    def _schedule_wake(self, at: float):
+        if at is None:
+            return
+        if self._timer is not None and not self._timer.cancelled():
+            if self._timer_at <= at:
+                return
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer_at = at
+        self._timer = loop.call_later(max(at - time.monotonic(), 0), self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            'inflight': self.inflight,
+            'hosts': {
+                n: {'queued': len(h.waiters), 'inflight': h.inflight, 'dispatched': h.dispatched, 'vtime': h.vtime}
+                for n, h in self.hosts.items()
+            },
+        }
+
+
+
+
+class _Slot():
+
+    def __init__(self, frontier: Frontier, host: str, priority: int, deadline: float):
+        self.frontier = frontier
+        self.host = host
+        self.priority = priority
+        self.deadline = deadline
+
+    async def __aenter__(self):
+        await self.frontier.acquire(self.host, self.priority, self.deadline)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.frontier.release(self.host)
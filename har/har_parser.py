@@ -1,11 +1,14 @@
 from __future__ import annotations
 import json
 import os
+import sys
 from rich import print
-import httpx
 from dataclasses import dataclass, field, asdict
 from typing import *
 
+if TYPE_CHECKING:
+    import httpx
+
 
 
 
@@ -84,7 +87,7 @@ class EntryList:
 
 
 
-@dataclass
+@dataclass(slots=True)
 class Entry:
 
     _initiator: str
@@ -108,14 +111,16 @@ class Entry:
             self.request = Request(**self.request)
         if isinstance(self.response, dict):
             self.response = Response(**self.response)
+        self._priority = _intern(self._priority)
+        self._resourceType = _intern(self._resourceType)
 
     @property
     def request_headers(self):
-        return self.request['headers']
+        return self.request.headers
 
     @property
     def response_headers(self):
-        return self.response['headers']
+        return self.response.headers
 
     @property
     def status(self):
@@ -142,14 +147,13 @@ class Entry:
         return self.response.headers.get('content-type')
 
     def print_info(self):
-        print(f"[{self.method} {self.status} {self.resource_type}] {e.url_without_params}")
+        print(f"[{self.method} {self.status} {self.resource_type}] {self.url_without_params}")
 
     def find_set_cookie_headers(self):
-        return list(filter(lambda h: h['name'] == 'set-cookie', self.response.headers.data))
+        return [{'name': 'set-cookie', 'value': v} for v in self.response.headers.get('set-cookie', many=True)]
     
     def have_set_cookie(self):
-        t = self.find_set_cookie_headers()
-        return len(t) != 0
+        return 'set-cookie' in self.response.headers
 
     def is_response_json(self):
         return self.response_content_type and 'application/json' in self.response_content_type
@@ -158,11 +162,12 @@ class Entry:
         params = {
             'method': self.request.method,
             'url': self.request.url,
-            'headers': {h['name']: h['value'] for h in self.request.headers.filter_comma_start()}
+            'headers': dict(self.request.headers.filter_comma_start_tuples())
         }
         return params
     
     def mimic(self) -> httpx.Response:
+        import httpx
         params = self.build_request_params()
         client = httpx.Client()
         req = client.build_request(**params)
@@ -172,7 +177,7 @@ class Entry:
 
 
 
-@dataclass
+@dataclass(slots=True)
 class Request:
     method: str
     url: str
@@ -187,10 +192,12 @@ class Request:
     def __post_init__(self):
         if isinstance(self.headers, list):
             self.headers = Headers(data=self.headers)
+        self.method = _intern(self.method)
+        self.httpVersion = _intern(self.httpVersion)
 
 
 
-@dataclass
+@dataclass(slots=True)
 class Response:
     status: str
     statusText: str
@@ -207,6 +214,8 @@ class Response:
     def __post_init__(self):
         if isinstance(self.headers, list):
             self.headers = Headers(data=self.headers)
+        self.statusText = _intern(self.statusText)
+        self.httpVersion = _intern(self.httpVersion)
 
 
 ignore_headers = [
@@ -220,26 +229,84 @@ ignore_headers_when_build_request = [
     ':method', ':authority', ':scheme', ':path'
 ]
 
-@dataclass
+_ignore_headers_set = frozenset(ignore_headers)
+
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
 class Headers:
-    data: list
+    """A compact, read-only list of HAR headers.
+
+    Header names are interned and stored in a tuple parallel to the values, and a 
+    lowercase name -> positions index is built once so that `get` and `in` are O(1) 
+    and case-insensitive. The `filter_*` methods yield `{'name', 'value'}` dicts like the
+    HAR data, and their `_tuples` variants yield `(name, value)` tuples without the copies.
+    """
+
+    __slots__ = ('names', 'values', 'lower_names', '_index')
+
+    def __init__(self, data: list[dict]):
+        self.names = tuple(sys.intern(h['name']) for h in data)
+        self.values = tuple(h['value'] for h in data)
+        self.lower_names = tuple(sys.intern(n.lower()) for n in self.names)
+        index = {}
+        for i, n in enumerate(self.lower_names):
+            if n in index:
+                index[n] += (i,)
+            else:
+                index[n] = (i,)
+        self._index = index
+
+    @property
+    def data(self) -> list[dict]:
+        return [{'name': n, 'value': v} for n, v in zip(self.names, self.values)]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return zip(self.names, self.values)
+
+    def __contains__(self, name: str):
+        return name.lower() in self._index
+
+    def __eq__(self, other):
+        if not isinstance(other, Headers):
+            return NotImplemented
+        return self.names == other.names and self.values == other.values
+
+    def __repr__(self):
+        return 'Headers({!r})'.format(self.to_tuples())
 
     def to_tuples(self):
-        return [(i['name'], i['value']) for i in self.data]
+        return list(zip(self.names, self.values))
 
     def to_dict(self):
-        return {i['name']: i['value'] for i in self.data}
+        return dict(zip(self.names, self.values))
 
     def filter_bording(self):
-        return filter(lambda h: h['name'].lower() not in ignore_headers, self.data)
+        return ({'name': n, 'value': v} for n, v in self.filter_bording_tuples())
 
     def filter_comma_start(self):
-        return filter(lambda h: h['name'][0] != ':', self.data)
+        return ({'name': n, 'value': v} for n, v in self.filter_comma_start_tuples())
+
+    def filter_bording_tuples(self):
+        return (
+            (n, v) for n, l, v in zip(self.names, self.lower_names, self.values) 
+            if l not in _ignore_headers_set
+        )
+
+    def filter_comma_start_tuples(self):
+        return ((n, v) for n, v in zip(self.names, self.values) if n[0] != ':')
 
     def get(self, name: str, many: bool = False):
-        t = list(filter(lambda h: h['name'].lower() == name.lower(), self.data))
+        t = self._index.get(name.lower(), ())
+        if many:
+            return map(self.values.__getitem__, t)
         if t:
-            return map(lambda h: h['value'], t) if many else t[0]['value']
+            return self.values[t[0]]
 
 
 # har_string = get_multiple_input('Enter HAR string:')
@@ -342,8 +409,7 @@ def build_request_params_from_entry(e):
     return params
 
 
-with open('har1.json', 'r') as f:
-    pass
+if __name__ == '__main__':
     # har = json.load(f)
     # entries = EntryList(har['log']['entries'])
 
@@ -376,14 +442,14 @@ with open('har1.json', 'r') as f:
     # print(res.text)
 
 
-ha = HarAnalyser()
-ha.load_from_file('har1.json')
+    ha = HarAnalyser()
+    ha.load_from_file('har1.json')
 
-for e in ha.entries.global_search('https://www.freelancer.com/api/projects/0.1/projects?atta'):
-    e.print_info()
-    # print(list(e.request.headers.filter_bording()))
-    # print(e.build_request_params())
+    for e in ha.entries.global_search('https://www.freelancer.com/api/projects/0.1/projects?atta'):
+        e.print_info()
+        # print(list(e.request.headers.filter_bording()))
+        # print(e.build_request_params())
 
-for e in ha.entries:
-    if e.is_response_json():
-        e.print_info()
\ No newline at end of file
+    for e in ha.entries:
+        if e.is_response_json():
+            e.print_info()
\ No newline at end of file
@@ -0,0 +1,208 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from typing import *
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    key TEXT PRIMARY KEY,
+    hash BLOB NOT NULL,
+    run INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hashes_run ON hashes (run);
+CREATE TABLE IF NOT EXISTS runs (
+    run INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL
+);
+"""
+
+NEW = 'new'
+MODIFIED = 'modified'
+REMOVED = 'removed'
+
+
+def _hasher():
+    try:
+        import xxhash
+        return lambda b: xxhash.xxh3_128_digest(b)
+    except ImportError:
+        return lambda b: hashlib.blake2b(b, digest_size=16).digest()
+
+
+def _to_bytes(content) -> bytes:
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return content
+    if isinstance(content, str):
+        return content.encode()
+    # extracted items, hashed independent of dict ordering
+    return json.dumps(content, sort_keys=True, default=str).encode()
+
+
+@dataclass
+class Change:
+    key: str
+    kind: str
+    run: int
+    time: float
+
+
+
+
+class ChangeTracker():
+    """Content hashes of crawled pages, for incremental re-crawls.
+
+    `check(key, content)` hashes a response body (or any extracted output) with xxhash
+    (blake2b when xxhash is not installed) and compares it with the hash stored by the
+    previous runs. Unchanged content returns `None`, so the caller can skip parsing and
+    writing it. New and modified content is recorded in the change feed.
+    `finish_run()` reports the keys that were not seen in this run as removed.
+
+    `check` records the new hash right away. To record it only once the content was
+    processed, call `compare` first and `commit` after processing succeeded, or `seen`
+    if it failed, which keeps the previous hash so the page is retried next run.
+
+    Parameters:
+
+     - `filename` (str) The SQLite database file holding the hashes.
+     - `feed_file` (str) A JSON-lines file that changes are appended to.
+     - `on_change` (function) Called with every `Change`.
+     - `batch_size` (int) Number of writes buffered before a commit.
+    """
+
+    def __init__(self, filename: str, feed_file: str = None, on_change: Callable[[Change], Any] = None, batch_size: int = 1000):
+        # shared with the event loop thread of a BlockingEngine, guarded by `lock`
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.hash = _hasher()
+        self.feed_file = feed_file
+        self.on_change = on_change
+        self.batch_size = batch_size
+
+        self.run = None
+        self.feed: list[Change] = []
+        self.counts = {NEW: 0, MODIFIED: 0, REMOVED: 0, 'unchanged': 0}
+        self._writes = []
+        self._seen = []
+        # keys compared in this run -> their hash, including those not written yet
+        self._run_hashes: dict[str, bytes] = {}
+
+    def start_run(self) -> int:
+        with self.lock:
+            cur = self.conn.execute('INSERT INTO runs (started) VALUES (?)', (time.time(),))
+            self.conn.commit()
+            self.run = cur.lastrowid
+            self.feed = []
+            self._run_hashes = {}
+            self.counts = {k: 0 for k in self.counts}
+            return self.run
+
+    def compare(self, key: str, content = None, digest: bytes = None) -> tuple[Optional[str], bytes]:
+        """Returns `'new'`, `'modified'` or `None`, and the hash, without recording anything.
+
+        `digest` is used as the hash instead of hashing `content`, e.g. when the body was
+        hashed while it was streamed to a file. A key that was already compared in this
+        run, like a page linked from two listings, is unchanged with a `None` hash, and
+        `commit` then only counts it.
+        """
+        h = digest if digest is not None else self.hash(_to_bytes(content))
+        with self.lock:
+            if self.run is None:
+                self.start_run()
+            if key in self._run_hashes:
+                return None, None
+            self._run_hashes[key] = h
+            row = self.conn.execute('SELECT hash FROM hashes WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return NEW, h
+        if row[0] != h:
+            return MODIFIED, h
+        return None, h
+
+    def commit(self, key: str, h: bytes, kind: Optional[str]):
+        """Record the hash returned by `compare`, and the change if there is one."""
+        with self.lock:
+            self.counts[kind or 'unchanged'] += 1
+            if h is None:
+                # a duplicate within the run
+                return
+            # unchanged keys are written too, to mark them as seen in this run
+            self._writes.append((key, h, self.run, time.time()))
+            if len(self._writes) >= self.batch_size:
+                self.flush()
+            if kind:
+                self._emit(key, kind)
+
+    def seen(self, key: str):
+        """Mark `key` as seen in this run and keep its previous hash, e.g. for an error response.
+
+        The key can then be compared again later in the run.
+        """
+        with self.lock:
+            if self.run is None:
+                self.start_run()
+            self._run_hashes.pop(key, None)
+            self._seen.append((self.run, key))
+            if len(self._seen) >= self.batch_size:
+                self.flush()
+
+    def check(self, key: str, content = None, digest: bytes = None) -> Optional[str]:
+        """Returns `'new'`, `'modified'`, or `None` when the content is unchanged."""
+        kind, h = self.compare(key, content, digest)
+        self.commit(key, h, kind)
+        return kind
+
+    def flush(self):
+        with self.lock:
+            if self._seen:
+                self.conn.executemany('UPDATE hashes SET run = ? WHERE key = ?', self._seen)
+                self._seen = []
+            if self._writes:
+                self.conn.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)', self._writes)
+                self._writes = []
+            self.conn.commit()
+
+    def finish_run(self, remove_unseen: bool = True) -> list[Change]:
+        """End the run and return its change feed.
+
+        With `remove_unseen`, every key that was not checked in this run is reported as
+        removed and forgotten. Turn it off for runs that only cover part of a site.
+        """
+        with self.lock:
+            self.flush()
+            if self.run is None:
+                return []
+            if remove_unseen:
+                removed = self.conn.execute('SELECT key FROM hashes WHERE run < ?', (self.run,)).fetchall()
+                for (key,) in removed:
+                    self.counts[REMOVED] += 1
+                    self._emit(key, REMOVED)
+                self.conn.execute('DELETE FROM hashes WHERE run < ?', (self.run,))
+            self.conn.execute('UPDATE runs SET finished = ? WHERE run = ?', (time.time(), self.run))
+            self.conn.commit()
+            self.run = None
+            self._run_hashes = {}
+            return self.feed
+
+    def _emit(self, key: str, kind: str):
+        c = Change(key, kind, self.run, time.time())
+        self.feed.append(c)
+        if self.feed_file:
+            with open(self.feed_file, 'a') as f:
+                f.write(json.dumps(asdict(c)) + '\n')
+        if self.on_change:
+            self.on_change(c)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
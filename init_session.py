@@ -1,4 +1,5 @@
 from scraping_tools.util import *
+from scraping_tools.session_store import SessionStore
 from bs4 import BeautifulSoup
 from httpx import AsyncClient, Client, Response, Request
 import asyncio
@@ -15,3 +16,8 @@ if __name__ == '__main__':
         res = client.get(url)
         soup = BeautifulSoup(res.text, 'lxml')
         tree = lxml.html.fromstring(res.text)
+    if len(sys.argv) > 2:
+        # share the session with workers, e.g. ScrapingEngineBase(session_store=SessionStore(path))
+        store = SessionStore(sys.argv[2])
+        print("Saved {} cookies to {}".format(store.save(client), sys.argv[2]))
+        store.close()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-import lxml.html
+from typing import Callable, Sequence
+from . import profiling
 
 
 @dataclass
@@ -41,18 +42,37 @@ class ItemField:
     first: bool = False
     default: str = None
     post: any = None
+    # runs once on the whole column of values, see batch_post.py
+    batch_post: Callable[[list], Sequence] = None
 
-    def extract_from_tree(self, tree):
-        temp = tree.xpath(self.xpath)
+    def extract_from_tree(self, tree, batch: bool = True):
+        p = profiling.active
+        if p is None:
+            temp = tree.xpath(self.xpath)
+        else:
+            temp = p.call('item_field:{}.xpath'.format(self.name), tree.xpath, self.xpath)
         if len(temp) == 0:
             # print('No result for {}'.format(self.xpath))
             return self.default
         else:
             temp = temp if not self.first else temp[0]
             if self.post:
-                temp = self.post(temp)
+                temp = profiling.call('item_field:{}.post'.format(self.name), self.post, temp) if p else self.post(temp)
+            if batch and self.batch_post:
+                temp = self.run_batch_post(temp) if not self.first else self.run_batch_post([temp])[0]
             return temp
 
+    def run_batch_post(self, column: list) -> Sequence:
+        if profiling.active is None:
+            output = self.batch_post(column)
+        else:
+            output = profiling.call('item_field:{}.batch_post'.format(self.name), self.batch_post, column)
+        # the values are matched back to their rows by position
+        if len(output) != len(column):
+            raise ValueError("batch_post of field '{}' returned {} values for {} rows".format(
+                self.name, len(output), len(column)))
+        return output
+
 
 
 def make_item_extractor(item: Item):
@@ -64,11 +84,15 @@ def make_item_extractor(item: Item):
 
 def extract_item_list_from_tree(tree, item):
     if item.root_xpath != None:
-        f_values = {f.name: f.extract_from_tree(tree) for f in item.fields}
         output = [
-            {f.name: f.extract_from_tree(i) for f in item.fields}
+            {f.name: f.extract_from_tree(i, batch=False) for f in item.fields}
             for i in tree.xpath(item.root_xpath)
         ]
+        for f in item.fields:
+            if f.batch_post and output:
+                column = f.run_batch_post([o[f.name] for o in output])
+                for o, v in zip(output, column):
+                    o[f.name] = v
         return output
     else:
         f_values = {}
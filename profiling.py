@@ -0,0 +1,167 @@
+"""Opt-in profiling of the scrape pipeline.
+
+    with Profiler() as p:
+        await engine.scrapers['detail'].scrape(url)
+    p.dump('crawl')   # crawl.txt (per-stage report) and crawl.collapsed (for flamegraphs)
+
+    # with a BlockingEngine, sample its event loop thread rather than the blocked caller
+    with Profiler(thread=blocking_engine.thread) as p:
+        list(blocking_engine.scrape_many('detail', urls))
+
+While a profiler is running, `RequestSenderBase` and `item_extractor` time every named
+stage and user function (`req_builder`, each `pre_req_build`, `send`, `callback`, `apply`,
+`pre_parse`, `ItemField` xpath/post/batch_post), and a sampling thread records the stack
+of the profiled thread every `interval` seconds. The samples are attributed to the
+innermost synchronous stage. The `.collapsed` file can be fed to flamegraph.pl or
+speedscope. When no profiler is running, each hook is a global lookup and a call.
+"""
+from __future__ import annotations
+from typing import *
+import os
+import sys
+import threading
+import time
+
+
+# the running profiler, None when profiling is disabled
+active: Profiler = None
+
+
+def call(stage: str, f: Callable, *args, **kwargs):
+    """Call the user function `f`, timed as `stage:<function name>` if a profiler is running."""
+    p = active
+    if p is None:
+        return f(*args, **kwargs)
+    return p.call(p.name(stage, f), f, *args, **kwargs)
+
+
+def function_name(f: Callable) -> str:
+    code = getattr(f, '__code__', None)
+    name = getattr(f, '__qualname__', None) or type(f).__name__
+    if code is None:
+        return name
+    return '{} ({}:{})'.format(name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+
+
+class Profiler():
+    """Records cumulative time and call counts per stage, and samples stacks.
+
+    Parameters:
+
+     - `interval` (float) Seconds between stack samples. 0 disables sampling.
+     - `max_depth` (int) The maximum number of frames kept per sample.
+     - `thread` (Thread | int) The thread (or thread id) to sample, the one running the
+     event loop. Defaults to the thread calling `start`.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64, thread: Union[threading.Thread, int] = None):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread = thread
+        self.stats: dict[str, list] = {}   # stage -> [calls, total seconds]
+        self.samples: dict[str, int] = {}  # collapsed stack -> count
+        self.stack: list[str] = []
+        self._names = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __enter__(self) -> Profiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        global active
+        active = self
+        self.started = time.perf_counter()
+        if self.interval:
+            self._stop.clear()
+            if self.thread is None:
+                thread_id = threading.get_ident()
+            elif isinstance(self.thread, threading.Thread):
+                thread_id = self.thread.ident
+            else:
+                thread_id = self.thread
+            self._thread = threading.Thread(target=self._sample, args=(thread_id,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        global active
+        if active is self:
+            active = None
+        self.duration = time.perf_counter() - self.started
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def name(self, stage: str, f: Callable) -> str:
+        # keyed by code object, so lambdas created on every call share one name
+        key = (stage, getattr(f, '__code__', None) or getattr(f, '__qualname__', None) or type(f))
+        if key not in self._names:
+            self._names[key] = '{}:{}'.format(stage, function_name(f))
+        return self._names[key]
+
+    def record(self, name: str, seconds: float):
+        s = self.stats.get(name)
+        if s is None:
+            self.stats[name] = [1, seconds]
+        else:
+            s[0] += 1
+            s[1] += seconds
+
+    def call(self, name: str, f: Callable, *args, **kwargs):
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+            self.stack.pop()
+
+    def _sample(self, thread_id: int):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                code = frame.f_code
+                frames.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            # the profiled thread pushes and pops while this runs, so index once and
+            # take an IndexError as an empty stack
+            try:
+                stage = self.stack[-1]
+            except IndexError:
+                stage = '<other>'
+            key = ';'.join([stage.replace(';', ',')] + frames[::-1])
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def report(self) -> str:
+        lines = ['{:<70} {:>10} {:>12} {:>12}'.format('stage', 'calls', 'total (s)', 'per call (ms)')]
+        for name, (calls, total) in sorted(self.stats.items(), key=lambda i: -i[1][1]):
+            lines.append('{:<70} {:>10} {:>12.4f} {:>12.4f}'.format(name[:70], calls, total, total / calls * 1000))
+        if self.samples:
+            per_stage = {}
+            for key, n in self.samples.items():
+                stage = key.split(';', 1)[0]
+                per_stage[stage] = per_stage.get(stage, 0) + n
+            total = sum(per_stage.values())
+            lines.append('')
+            lines.append('{:<70} {:>10} {:>12}'.format('samples by stage', 'samples', 'share'))
+            for stage, n in sorted(per_stage.items(), key=lambda i: -i[1]):
+                lines.append('{:<70} {:>10} {:>11.1%}'.format(stage[:70], n, n / total))
+        return '\n'.join(lines)
+
+    def dump(self, prefix: str):
+        """Write `<prefix>.txt` with the report and `<prefix>.collapsed` with the stack samples."""
+        with open(prefix + '.txt', 'w') as f:
+            f.write(self.report() + '\n')
+        with open(prefix + '.collapsed', 'w') as f:
+            for key, n in self.samples.items():
+                f.write('{} {}\n'.format(key, n))
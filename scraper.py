@@ -1,12 +1,22 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
+from collections import OrderedDict
 from enum import Flag
 from typing import *
-from httpx import Client, AsyncClient, Response, Request
 from .util import create_aclient
-from bs4 import BeautifulSoup
-import lxml.html
+from .workflow import Stage, Workflow
+from .body_policy import BodyRejected, send_with_policy
+from . import profiling
 import asyncio
+import time
+
+if TYPE_CHECKING:
+    from httpx import Client, AsyncClient, Response, Request
+    from .concurrency import AdaptiveLimiter
+    from .session_store import SessionStore
+    from .frontier import Frontier
+    from .incremental import ChangeTracker
+    from .body_policy import BodyPolicy
 
 
 
@@ -15,7 +25,11 @@ def make_scraper(
     engine, 
     req_builder: Union[Callable[[dict], dict], dict], 
     pre_req_build: Callable[[dict], dict] = lambda r, _: r,
-    callback: Callable[[Response], Any] = lambda r: r
+    callback: Callable[[Response], Any] = lambda r: r,
+    priority: int = 0,
+    deadline: float = None,
+    incremental: bool = False,
+    body_policy: BodyPolicy = None,
 ) -> RequestSenderBase:
     """Generate a RequestSenderBase object given pre_req_build and post request callback.
     
@@ -30,6 +44,17 @@ def make_scraper(
       parameters and returns a new dictionary of request parameters. This method is executed before building. This can also be a list of methods that will be executed sequencially.
      the request object.
      - `callback` (function) A method that is executed and returned after making the request.
+     - `priority` (int) Requests with a higher priority are sent first when the engine has
+     a `Frontier`.
+     - `deadline` (float) Seconds after `scrape` is called by which the requests should be
+     sent. Requests close to their deadline are sent before any other request when the
+     engine has a `Frontier`.
+     - `incremental` (bool) Skip the callback for responses whose body has not changed since
+     the last crawl, when the engine has a `ChangeTracker`. `scrape` then returns None. The
+     new hash is only recorded once the callback returned, so a page whose callback raised
+     is treated as changed again in the next run.
+     - `body_policy` (BodyPolicy) Size limit, content type allowlist and download-to-file
+     mode for the response bodies. Defaults to the `body_policy` of the engine.
     """
     # if the request build is a request param dictionary
     # then generate a method that returns this dictionary
@@ -42,6 +67,10 @@ def make_scraper(
         req_builder=req_builder, 
         pre_req_build=pre_req_build, 
         callback=callback,
+        priority=priority,
+        deadline=deadline,
+        incremental=incremental,
+        body_policy=body_policy,
     )
     return request_sender
 
@@ -60,27 +89,43 @@ class ScraperModuleBase():
         self,
         req_builder: Union[Callable[[dict], dict], dict], 
         pre_req_build: Callable[[dict], dict] = lambda r, _: r,
-        callback: Callable[[Response], Any] = lambda r: r
+        callback: Callable[[Response], Any] = lambda r: r,
+        priority: int = 0,
+        deadline: float = None,
+        incremental: bool = False,
+        body_policy: BodyPolicy = None,
     ):
         return make_scraper(
             self,
             req_builder,
             pre_req_build=pre_req_build,
-            callback=callback
+            callback=callback,
+            priority=priority,
+            deadline=deadline,
+            incremental=incremental,
+            body_policy=body_policy,
         )
 
     def register_scraper(
         self, 
         name: str,
         pre_req_build: Callable[[dict], dict] = lambda r, _: r,
-        callback: Callable[[Response], Any] = lambda r: r
+        callback: Callable[[Response], Any] = lambda r: r,
+        priority: int = 0,
+        deadline: float = None,
+        incremental: bool = False,
+        body_policy: BodyPolicy = None,
     ) -> Callable:
         def wrapper(req_builder: RequestBuilder):
             self.scrapers[name] = make_scraper(
                 None,
                 req_builder, 
                 pre_req_build=pre_req_build, 
-                callback=callback
+                callback=callback,
+                priority=priority,
+                deadline=deadline,
+                incremental=incremental,
+                body_policy=body_policy,
             )
             # print("Scraper registered: {}".format(name))
             return self.scrapers[name]
@@ -94,6 +139,23 @@ class ScraperModuleBase():
             self.workflows[name] = lambda *args, **kwargs: w(self, *args, **kwargs)
         return wrapper
 
+    def add_workflow(self, name: str, stages: list[Stage], queue_size: int = 0) -> Workflow:
+        """Register a workflow declared as a DAG of stages. See `Workflow` and `Stage`.
+
+        The workflow is stored in `self.workflows` and can be run with
+        `await module.workflows[name](inputs)`.
+        """
+        self.workflows[name] = Workflow(self, stages, queue_size=queue_size)
+        return self.workflows[name]
+
+    def get_scraper(self, name: str) -> RequestSenderBase:
+        """Look up a registered scraper. Scrapers of loaded modules are named `'module.scraper'`."""
+        m = self
+        *path, name = name.split('.')
+        for p in path:
+            m = m.modules[p]
+        return m.scrapers[name]
+
     def set_engine(self, engine: ScrapingEngineBase):
         for s in self.scrapers.values():
             s.engine = engine
@@ -111,20 +173,49 @@ class ScrapingEngineBase(ScraperModuleBase):
     initial_static_headers = {}
     global_headers = {}
     header_set = {}
+    # saved to the `session_store` as JSON, so values must be JSON serializable
     states = {}
 
-    def __init__(self, cookie: str = '', client_kw={}):
+    def __init__(
+        self, 
+        cookie: str = '', 
+        client_kw={}, 
+        limiter: AdaptiveLimiter = None, 
+        session_store: SessionStore = None,
+        frontier: Frontier = None,
+        change_tracker: ChangeTracker = None,
+        body_policy: BodyPolicy = None,
+    ):
         super().__init__()
 
         self.client: AsyncClient = create_aclient(**client_kw)
+        self.limiter = limiter
+        self.frontier = frontier
+        self.change_tracker = change_tracker
+        self.body_policy = body_policy
+        self.session_store = session_store
 
         self.client.headers.update(self.initial_static_headers)
 
         if cookie:
             self.client.headers.update({'cookie': cookie})
 
+        if session_store:
+            session_store.load(self.client, self.states)
+
+    async def save_session(self) -> int:
+        """Save changed cookies and states to the session store without blocking the loop."""
+        if not self.session_store:
+            return 0
+        return await self.session_store.asave(self.client, self.states)
+
     async def aclose(self) -> Coroutine[None]:
-        await self.client.aclose()
+        try:
+            await self.save_session()
+            if self.change_tracker:
+                self.change_tracker.flush()
+        finally:
+            await self.client.aclose()
 
     def set_engine(self, _: ScrapingEngineBase):
         pass
@@ -133,14 +224,22 @@ class ScrapingEngineBase(ScraperModuleBase):
         self, 
         name: str,
         pre_req_build: Callable[[dict], dict] = lambda r, _: r,
-        callback: Callable[[Response], Any] = lambda r: r
+        callback: Callable[[Response], Any] = lambda r: r,
+        priority: int = 0,
+        deadline: float = None,
+        incremental: bool = False,
+        body_policy: BodyPolicy = None,
     ) -> Callable:
         def wrapper(req_builder: RequestBuilder):
             self.scrapers[name] = make_scraper(
                 self,
                 req_builder, 
                 pre_req_build=pre_req_build, 
-                callback=callback
+                callback=callback,
+                priority=priority,
+                deadline=deadline,
+                incremental=incremental,
+                body_policy=body_policy,
             )
             return self.scrapers[name]
             # print("Scraper registered: {}".format(name))
@@ -150,20 +249,64 @@ class ScrapingEngineBase(ScraperModuleBase):
         super().load_scraper_module(name, module)
         module.set_engine(self)
 
-    def start_many(self, req_builders: Callable[[dict], Iterable], sync: bool = True) -> RequestSenderBase:
-        request_sender = RequestSenderBase(self, req_builders, many=True, sync=sync)
+    def start_many(
+        self, 
+        req_builders: Callable[[dict], Iterable], 
+        sync: bool = True, 
+        priority: int = 0, 
+        deadline: float = None
+    ) -> RequestSenderBase:
+        request_sender = RequestSenderBase(self, req_builders, many=True, sync=sync, priority=priority, deadline=deadline)
         return request_sender
 
     def add_global_headers(self, headers: dict):
         # self.global_headers.update(headers)
         self.client.headers.update(headers)
+
+    def telemetry(self) -> dict:
+        """Per-host concurrency limit, latency percentiles and limit adjustments."""
+        return self.limiter.telemetry() if self.limiter else {}
     
 
 
 
-async def send_request_with_params(client: AsyncClient, params: dict) -> Response:
+async def send_request_with_params(
+    client: AsyncClient, 
+    params: dict, 
+    limiter: AdaptiveLimiter = None,
+    frontier: Frontier = None,
+    priority: int = 0,
+    deadline: float = None,
+    body_policy: BodyPolicy = None,
+) -> Response:
+    if frontier is not None:
+        async with frontier.slot(params.get('url', ''), priority, deadline):
+            return await send_request_with_params(client, params, limiter, body_policy=body_policy)
+
     req = client.build_request(**params)
-    res = await client.send(req)
+    if limiter is None:
+        return await send_with_policy(client, req, body_policy)
+
+    host_limit = limiter.get_for_params(params)
+    started = await host_limit.acquire()
+    error = True
+    cancelled = False
+    try:
+        res = await send_with_policy(client, req, body_policy)
+        error = limiter.is_error_status(res.status_code)
+    except BodyRejected:
+        # the host answered fine, the body just isn't wanted
+        error = False
+        raise
+    except asyncio.CancelledError:
+        # abandoned by the caller, e.g. a closed scrape_many, says nothing about the host
+        cancelled = True
+        raise
+    finally:
+        if cancelled:
+            await host_limit.discard()
+        else:
+            await host_limit.release(started, error=error)
     return res
             
 
@@ -185,10 +328,22 @@ class RequestSenderBase():
     many: bool = False
     sync: bool = True
 
+    priority: int = 0
+    deadline: float = None
+    incremental: bool = False
+    body_policy: BodyPolicy = None
+
+    # parsed trees per response: id(response) -> [response, {parser: tree}, estimated size]
+    parse_cache: OrderedDict = field(default_factory=OrderedDict, init=False, repr=False)
+    # estimated memory in bytes of the cached trees (see `tree_size_factors`) before the
+    # trees of the least recently used responses are released
+    parse_cache_limit: int = 64 * 1024 ** 2
+    parse_cache_size: int = field(default=0, init=False, repr=False)
+
     # async def scrape(self, **input_kwargs) -> Coroutine[Any, Any, RequestSenderBase]:
     async def scrape(self, *input_args, **input_kwargs: dict) -> RequestSenderBase:
         # build request params from input kwargs using user-defined request builder
-        req_params = self.req_builder(self.engine, *input_args, **input_kwargs)
+        req_params = profiling.call('req_builder', self.req_builder, self.engine, *input_args, **input_kwargs)
         if isinstance(req_params, Generator):
             req_params = list(req_params)
             if len(req_params) == 1:
@@ -197,58 +352,205 @@ class RequestSenderBase():
         req_params = self._process_params(req_params)
         
         c = self.engine.client
+        send_kw = {
+            'limiter': self.engine.limiter,
+            'frontier': self.engine.frontier,
+            'priority': self.priority,
+            'deadline': time.monotonic() + self.deadline if self.deadline is not None else None,
+            'body_policy': self.body_policy or self.engine.body_policy,
+        }
+        started = time.perf_counter()
         if self.many:
             if self.sync: 
-                res = [await send_request_with_params(c, r) for r in req_params]
+                res = [await send_request_with_params(c, r, **send_kw) for r in req_params]
             else:
-                res = await asyncio.gather(*[send_request_with_params(c, r) for r in req_params])
+                res = await asyncio.gather(*[send_request_with_params(c, r, **send_kw) for r in req_params])
         else:
-            res = await send_request_with_params(c, req_params)
+            res = await send_request_with_params(c, req_params, **send_kw)
+        if profiling.active is not None:
+            # sends of concurrent scrapes overlap, this is wall time in flight
+            profiling.active.record('send', time.perf_counter() - started)
+
+        # hashes of changed pages, recorded once the callback succeeded
+        pending = []
+        tracker = self.engine.change_tracker
+        if self.incremental and tracker is not None:
+            if self.many:
+                res = [r for r in res if self._changed(tracker, r, pending)]
+                if not res:
+                    return None
+            elif not self._changed(tracker, res, pending):
+                return None
 
         # add the response to the result queue
         self.result_queue.append(res)
 
-        return self.callback(self)
+        done = False
+        try:
+            output = profiling.call('callback', self.callback, self)
+            done = True
+            return output
+        finally:
+            for key, h, kind in pending:
+                if done:
+                    tracker.commit(key, h, kind)
+                else:
+                    # keep the previous hash, so the page counts as changed again next run
+                    tracker.seen(key)
+            # the chain is complete, the parsed trees are not shared any more
+            for r in (res if self.many else [res]):
+                self.release_parsed(r)
+
+
+    def _changed(self, tracker: ChangeTracker, res: Response, pending: list) -> bool:
+        key = str(res.url)
+        # error responses are always passed on and don't replace the stored hash
+        if not res.is_success:
+            tracker.seen(key)
+            return True
+        # a body streamed to a file by a BodyPolicy is empty here, but was hashed on the way
+        digest = res.extensions.get('hash')
+        kind, h = tracker.compare(key, res.content, bytes.fromhex(digest) if digest else None)
+        if kind is None:
+            tracker.commit(key, h, kind)
+            return False
+        pending.append((key, h, kind))
+        return True
 
 
     def _process_params(self, req_params):
         if isinstance(self.pre_req_build, Callable):
-            req_params = self.pre_req_build(req_params, self.engine)
+            req_params = profiling.call('pre_req_build', self.pre_req_build, req_params, self.engine)
             return req_params
         elif isinstance(self.pre_req_build, Iterable):
             for pr in self.pre_req_build:
-                req_params = pr(req_params, self.engine)
+                req_params = profiling.call('pre_req_build', pr, req_params, self.engine)
             return req_params
         else:
             print("Invalid pre request build type: {}, must be a function or a list of functions".format(type(self.pre_req_build)))
             return req_params
 
 
-    def apply(self, f: Callable[[Any], Any], with_engine=False) -> RequestSenderBase:
-        o = self.result_queue[-1]
+    def apply(self, f: Callable[[Any], Any], with_engine=False, parser: str = None) -> RequestSenderBase:
+        """Apply `f` to the latest result, or to the latest response parsed with `parser`."""
+        o = self.get() if parser is None else self.parse(parser)
         if o == None:
             return self
         if with_engine:
-            n = f(o, self.engine)
+            n = profiling.call('apply', f, o, self.engine)
         else:
-            n = f(o)
+            n = profiling.call('apply', f, o)
         o = self.result_queue.append(n)
         return self
     
 
     def get(self) -> Any:
-        return self.result_queue[-1]
+        o = self.result_queue[-1]
+        if isinstance(o, ParsedRef):
+            return self.parse(o.parser, o.res)
+        return o
 
     
     def pre_parse(self, pre_parser: str) -> RequestSenderBase:
-        pre_parsers = {
-            'soup': lambda r: BeautifulSoup(r.text, 'lxml'),
-            'lxml': lambda r: lxml.html.fromstring(r.text),
-            'json': lambda r: r.json(),
-            '': lambda res: res,
-        }
         if pre_parser not in pre_parsers.keys():
             print("'{}' pre parser not supported".format(pre_parser))
-        else:
+        elif not pre_parser:
             self.apply(pre_parsers[pre_parser])
+        else:
+            self.parse(pre_parser)
+            # the tree itself is only held by the parse cache, so that releasing it frees it
+            self.result_queue.append(ParsedRef(self.latest_response(), pre_parser))
         return self
+
+
+    def latest_response(self) -> Union[Response, list[Response]]:
+        """The latest response in the result queue, or the latest list of responses of a `many` scraper."""
+        from httpx import Response
+        for o in reversed(self.result_queue):
+            if isinstance(o, Response):
+                return o
+            if isinstance(o, list) and o and all(isinstance(r, Response) for r in o):
+                return o
+
+
+    def parse(self, pre_parser: str, res: Response = None) -> Any:
+        """Parse `res` (the latest response by default) with a pre parser.
+
+        A response is parsed at most once per parser while it is cached, so calling
+        `pre_parse('soup')` and then `pre_parse('lxml')`, or several extractors with
+        `apply(..., parser='lxml')`, share the same trees. Trees are released when the
+        callback chain of `scrape` completes, or least recently used first when their
+        estimated size (the body size times the factor of the parser in
+        `tree_size_factors`) exceeds `parse_cache_limit` bytes. `pre_parse` only keeps a
+        reference in the result queue, so a released tree is freed unless the callback
+        holds on to it, and `get` parses the response again if needed. A list of
+        responses, as sent by a `many` scraper, is parsed into a list of trees.
+        """
+        if res is None:
+            res = self.latest_response()
+        if res is None or not pre_parser:
+            return res
+        if isinstance(res, list):
+            return [self.parse(pre_parser, r) for r in res]
+
+        entry = self.parse_cache.get(id(res))
+        if entry is None:
+            entry = self.parse_cache[id(res)] = [res, {}, 0]
+        else:
+            self.parse_cache.move_to_end(id(res))
+        trees = entry[1]
+        if pre_parser not in trees:
+            tree = trees[pre_parser] = profiling.call('pre_parse', pre_parsers[pre_parser], res)
+            size = len(res.content) * tree_size_factors.get(pre_parser, 1)
+            entry[2] += size
+            self.parse_cache_size += size
+        else:
+            tree = trees[pre_parser]
+
+        while self.parse_cache_size > self.parse_cache_limit and len(self.parse_cache) > 1:
+            _, (_, _, size) = self.parse_cache.popitem(last=False)
+            self.parse_cache_size -= size
+        return tree
+
+
+    def release_parsed(self, res: Response):
+        entry = self.parse_cache.pop(id(res), None)
+        if entry is not None:
+            self.parse_cache_size -= entry[2]
+
+
+
+class ParsedRef():
+    """A parsed response in the result queue, resolved through the parse cache by `get`."""
+
+    __slots__ = ('res', 'parser')
+
+    def __init__(self, res: Union[Response, list[Response]], parser: str):
+        self.res = res
+        self.parser = parser
+
+
+# approximate memory of a parsed tree per byte of body, measured on listing pages
+tree_size_factors = {
+    'soup': 25,
+    'lxml': 12,
+    'json': 4,
+}
+
+
+def parse_soup(r: Response):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(r.text, 'lxml')
+
+
+def parse_lxml(r: Response):
+    import lxml.html
+    return lxml.html.fromstring(r.text)
+
+
+pre_parsers = {
+    'soup': parse_soup,
+    'lxml': parse_lxml,
+    'json': lambda r: r.json(),
+    '': lambda res: res,
+}
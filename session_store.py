@@ -0,0 +1,214 @@
+from __future__ import annotations
+from http.cookiejar import Cookie, CookieJar
+from typing import *
+import asyncio
+import json
+import sqlite3
+import threading
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cookies (
+    session TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    expires INTEGER,
+    secure INTEGER,
+    rest TEXT,
+    PRIMARY KEY (session, domain, path, name)
+);
+CREATE TABLE IF NOT EXISTS states (
+    session TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (session, key)
+);
+"""
+
+
+def cookie_to_row(c: Cookie) -> tuple:
+    return (c.domain, c.path, c.name, c.value, c.expires, int(c.secure), json.dumps(c._rest))
+
+
+def row_to_cookie(domain, path, name, value, expires, secure, rest) -> Cookie:
+    return Cookie(
+        version=0, name=name, value=value,
+        port=None, port_specified=False,
+        domain=domain, domain_specified=bool(domain), domain_initial_dot=domain.startswith('.'),
+        path=path, path_specified=True,
+        secure=bool(secure), expires=expires, discard=expires is None,
+        comment=None, comment_url=None, rest=json.loads(rest) if rest else {},
+    )
+
+
+def _jar(cookies) -> CookieJar:
+    # httpx.Cookies wraps a CookieJar
+    return getattr(cookies, 'jar', cookies)
+
+
+class SessionStore():
+    """Cookies and engine states persisted in a SQLite database.
+
+    The database is opened in WAL mode, so several worker processes can share one
+    session file: readers don't block the writer, and writes wait up to `timeout`
+    seconds for the lock. Saves are incremental. Only the cookies and states that
+    changed since the last load/save of this store are written, which also keeps
+    workers from overwriting each other's unrelated changes.
+
+    Parameters:
+
+     - `filename` (str) The SQLite database file.
+     - `session` (str) The session name, so one file can hold several sessions.
+     - `timeout` (float) Seconds to wait for the database lock, including while another
+     worker is running `warm_up`.
+    """
+
+    def __init__(self, filename: str, session: str = 'default', timeout: float = 60):
+        self.filename = filename
+        self.session = session
+        self.timeout = timeout
+        self.conn = sqlite3.connect(filename, timeout=timeout, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        # the rows as last seen in the database, used to compute incremental updates
+        self._cookies: dict[tuple, tuple] = {}
+        self._states: dict[str, str] = {}
+
+    def close(self):
+        self.conn.close()
+
+    def load_cookies(self, cookies) -> int:
+        with self.lock:
+            rows = self._stored_cookies()
+        jar = _jar(cookies)
+        for k, r in rows.items():
+            jar.set_cookie(row_to_cookie(*r))
+            self._cookies[k] = r
+        return len(rows)
+
+    def load_states(self, states: dict) -> int:
+        with self.lock:
+            rows = self.conn.execute('SELECT key, value FROM states WHERE session = ?', (self.session,)).fetchall()
+        for k, v in rows:
+            states[k] = json.loads(v)
+            self._states[k] = v
+        return len(rows)
+
+    def _stored_cookies(self) -> dict[tuple, tuple]:
+        rows = self.conn.execute(
+            'SELECT domain, path, name, value, expires, secure, rest FROM cookies WHERE session = ?',
+            (self.session,)
+        ).fetchall()
+        return {r[:3]: tuple(r) for r in rows}
+
+    def save_cookies(self, cookies, replace: bool = False) -> int:
+        """Write the cookies that changed since the last load/save. Returns the number of changes.
+
+        With `replace`, the cookies are compared with the rows stored in the database
+        instead, so the stored session ends up holding exactly `cookies`. Use it when the
+        store didn't load the session the cookies came from.
+        """
+        current = {}
+        for c in _jar(cookies):
+            r = cookie_to_row(c)
+            current[r[:3]] = r
+        with self.lock:
+            if replace:
+                self._cookies = self._stored_cookies()
+            upserts = [(self.session, *r) for k, r in current.items() if self._cookies.get(k) != r]
+            deletes = [(self.session, *k) for k in self._cookies if k not in current]
+            if upserts or deletes:
+                with self.conn:
+                    self.conn.executemany('INSERT OR REPLACE INTO cookies VALUES (?, ?, ?, ?, ?, ?, ?, ?)', upserts)
+                    self.conn.executemany('DELETE FROM cookies WHERE session = ? AND domain = ? AND path = ? AND name = ?', deletes)
+            self._cookies = current
+        return len(upserts) + len(deletes)
+
+    def save_states(self, states: dict) -> int:
+        """Write the states that changed since the last load/save. Values must be JSON serializable."""
+        current = {}
+        for k, v in states.items():
+            try:
+                current[k] = json.dumps(v)
+            except TypeError as e:
+                raise TypeError('State {!r} is not JSON serializable: {}'.format(k, e)) from None
+        with self.lock:
+            upserts = [(self.session, k, v) for k, v in current.items() if self._states.get(k) != v]
+            deletes = [(self.session, k) for k in self._states if k not in current]
+            if upserts or deletes:
+                with self.conn:
+                    self.conn.executemany('INSERT OR REPLACE INTO states VALUES (?, ?, ?)', upserts)
+                    self.conn.executemany('DELETE FROM states WHERE session = ? AND key = ?', deletes)
+            self._states = current
+        return len(upserts) + len(deletes)
+
+    def load(self, client, states: dict = None) -> bool:
+        """Load cookies into `client` (and states into `states`). Returns whether a session was stored."""
+        n = self.load_cookies(client.cookies)
+        if states is not None:
+            n += self.load_states(states)
+        return n > 0
+
+    def save(self, client, states: dict = None) -> int:
+        n = self.save_cookies(client.cookies)
+        if states is not None:
+            n += self.save_states(states)
+        return n
+
+    async def aload(self, client, states: dict = None) -> bool:
+        return await asyncio.to_thread(self.load, client, states)
+
+    async def asave(self, client, states: dict = None) -> int:
+        # snapshot in the event loop thread, write in a worker thread
+        jar = CookieJar()
+        for c in _jar(client.cookies):
+            jar.set_cookie(c)
+        snapshot = dict(states) if states is not None else None
+        def save():
+            n = self.save_cookies(jar)
+            if snapshot is not None:
+                n += self.save_states(snapshot)
+            return n
+        return await asyncio.to_thread(save)
+
+    async def warm_up(self, client, login: Callable[[Any], Awaitable], states: dict = None) -> bool:
+        """Load the stored session, or run `login(client)` once if there is none.
+
+        The check and the login run inside an exclusive transaction on a dedicated
+        connection, so when many workers start at the same time only the first one logs
+        in and the others wait for it and load its session. Returns whether `login` was
+        called.
+        """
+        conn = sqlite3.connect(self.filename, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        try:
+            await asyncio.to_thread(conn.execute, 'BEGIN IMMEDIATE')
+            try:
+                stored = conn.execute(
+                    'SELECT 1 FROM cookies WHERE session = ? UNION SELECT 1 FROM states WHERE session = ? LIMIT 1',
+                    (self.session, self.session)
+                ).fetchone()
+                if not stored:
+                    await login(client)
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO cookies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        [(self.session, *cookie_to_row(c)) for c in _jar(client.cookies)]
+                    )
+                    if states is not None:
+                        conn.executemany(
+                            'INSERT OR REPLACE INTO states VALUES (?, ?, ?)',
+                            [(self.session, k, json.dumps(v)) for k, v in states.items()]
+                        )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        # load the stored rows, which also records them as the baseline for incremental saves
+        await self.aload(client, states)
+        return not stored
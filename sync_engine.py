@@ -0,0 +1,121 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import *
+import asyncio
+import threading
+
+if TYPE_CHECKING:
+    from .scraper import ScrapingEngineBase, RequestSenderBase
+
+
+class BlockingEngine():
+    """A blocking facade over a `ScrapingEngineBase` for code that is not async.
+
+    The engine runs on an event loop in a background thread. `scrape_many` keeps
+    `concurrency` scrapes in flight on that loop, like `asyncio.gather` would, and returns
+    a lazy iterator over the results, so sync scripts get the throughput of the async path.
+
+        with BlockingEngine(MyEngine(), concurrency=20) as engine:
+            for item in engine.scrape_many('detail', urls):
+                ...
+
+    Parameters:
+
+     - `engine` (ScrapingEngineBase) The engine. It is closed with the facade.
+     - `concurrency` (int) The default number of in-flight scrapes of `scrape_many`.
+    """
+
+    def __init__(self, engine: ScrapingEngineBase, concurrency: int = 10):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='scraping-engine-loop', daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> BlockingEngine:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """Run a coroutine on the engine loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def _scraper(self, scraper: Union[str, RequestSenderBase]) -> RequestSenderBase:
+        return self.engine.get_scraper(scraper) if isinstance(scraper, str) else scraper
+
+    def scrape(self, scraper: Union[str, RequestSenderBase], *args, **kwargs) -> Any:
+        return self.run(self._scraper(scraper).scrape(*args, **kwargs))
+
+    def scrape_many(
+        self,
+        scraper: Union[str, RequestSenderBase],
+        inputs: Iterable,
+        concurrency: int = None,
+        ordered: bool = False,
+        return_exceptions: bool = False,
+    ) -> Iterator[Any]:
+        """Scrape every input and yield the results as they complete.
+
+        Inputs are read lazily, only `concurrency` of them are in flight at once, and each
+        one is passed to `scraper.scrape` as its only positional argument. With `ordered`
+        the results are yielded in the order of the inputs. A failed scrape raises its
+        exception from the iterator, or is yielded when `return_exceptions` is set.
+        """
+        s = self._scraper(scraper)
+        concurrency = concurrency or self.concurrency
+        inputs = iter(inputs)
+        pending = deque() if ordered else set()
+
+        def fill():
+            while len(pending) < concurrency:
+                try:
+                    i = next(inputs)
+                except StopIteration:
+                    return
+                f = self.submit(s.scrape(i))
+                if ordered:
+                    pending.append(f)
+                else:
+                    pending.add(f)
+
+        def result(f: Future):
+            e = f.exception()
+            if e is None:
+                return f.result()
+            if return_exceptions:
+                return e
+            raise e
+
+        try:
+            fill()
+            while pending:
+                if ordered:
+                    f = pending.popleft()
+                    wait([f])
+                    done = [f]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    pending.difference_update(done)
+                fill()
+                for f in done:
+                    yield result(f)
+        finally:
+            # the iterator was closed early, don't leave scrapes running
+            for f in pending:
+                f.cancel()
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        try:
+            self.run(self.engine.aclose())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
@@ -1,15 +1,18 @@
+from __future__ import annotations
 import timeit
-from httpx import AsyncClient, Client, Response
-import dateutil.parser
-import requests
-import pickle
 from rich import print
 import random
-from bs4 import Tag
 from typing import *
+from functools import lru_cache
 from .assets import *
 import re
 
+if TYPE_CHECKING:
+    from httpx import AsyncClient, Client, Response
+    from bs4 import Tag
+    import requests
+    from .proxy_pool import ProxyPool
+
 
 def with_client(func):
     def wrapper(*args, client: requests.Session = None, **kwargs):
@@ -21,28 +24,114 @@ def with_client(func):
     return wrapper
 
 
+# cookie files with these suffixes are SQLite session stores instead of pickles
+session_store_suffixes = ('.db', '.sqlite', '.sqlite3')
+
+
 def load_cookie(client: AsyncClient, cookie_filename):
+    if cookie_filename.endswith(session_store_suffixes):
+        from .session_store import SessionStore
+        store = SessionStore(cookie_filename)
+        store.load_cookies(client.cookies)
+        store.close()
+        return
+    import pickle
     with open(cookie_filename, 'rb') as f:
         client.cookies.update(pickle.load(f))
 
 
 def save_cookie(cookie_jar, cookie_filename):
+    if cookie_filename.endswith(session_store_suffixes):
+        from .session_store import SessionStore
+        store = SessionStore(cookie_filename)
+        # overwrite the stored cookies, like the pickle file is overwritten
+        store.save_cookies(cookie_jar, replace=True)
+        store.close()
+        return
+    import pickle
     with open(cookie_filename, 'wb') as f:
         pickle.dump(cookie_jar, f)
 
 
+# \w, \d, \s and \b match Unicode in str patterns but only ASCII in bytes patterns, and
+# `.` and negated classes match a character in str patterns but a single byte of it in
+# bytes patterns (a literal `.` inside a class is flagged too, to be safe)
+_unicode_classes = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[wWdDsSbB]|\.|\[\^)')
+
+
+@lru_cache(maxsize=256)
+def bytes_safe(target: str) -> bool:
+    """Whether the str pattern `target` matches the same on raw utf-8 bytes as on text."""
+    if not target.isascii() or _unicode_classes.search(target):
+        return False
+    # case-insensitive str patterns also match non-ASCII letters, like the Kelvin sign for k
+    return not re.compile(target).flags & re.IGNORECASE
+
+
+@lru_cache(maxsize=256)
+def compile_bytes_pattern(target: Union[str, bytes]) -> re.Pattern:
+    if isinstance(target, str):
+        if not bytes_safe(target):
+            raise ValueError(
+                'Pattern {!r} has non-ASCII characters, Unicode classes, `.` or negated classes and would match '
+                'differently on bytes, pass a bytes pattern or a decoded source'.format(target))
+        target = target.encode()
+    return re.compile(target)
+
+
+def _match_value(m: re.Match, encoding: str = None):
+    # same shape as the items of re.findall: the whole match, the only group or a tuple of groups
+    empty = m.string[:0]
+    if m.re.groups == 0:
+        v = m.group(0)
+    elif m.re.groups == 1:
+        v = m.group(1) or empty
+    else:
+        v = m.groups(empty)
+        return tuple(bytes(i).decode(encoding, 'replace') for i in v) if encoding else v
+    return bytes(v).decode(encoding, 'replace') if encoding else v
+
+
+def regex_select(source, target, first: bool = True, encoding: str = 'utf-8') -> list:
+    """Like `re.findall`, but stops at the first match when `first` is set.
+
+    For bytes-like sources (bytes, bytearray, memoryview, e.g. `res.content`) the pattern
+    is compiled as a bytes pattern and run on the raw buffer, and only the matched slices
+    are decoded with `encoding`, so the body is never decoded as a whole. A str pattern
+    with non-ASCII characters, `\\w`, `\\d`, `\\s` or `\\b` classes, `.`, negated classes or
+    `re.IGNORECASE` would match differently there (ASCII only, or single bytes of a
+    character), so the source is decoded with `encoding` and the str pattern used
+    instead. Pass a bytes pattern to keep such patterns on the raw buffer.
+    """
+    if not isinstance(source, str):
+        text = target.pattern if isinstance(target, re.Pattern) else target
+        if isinstance(text, str) and (isinstance(target, re.Pattern) or not bytes_safe(text)):
+            source = bytes(source).decode(encoding, 'replace')
+    if isinstance(source, str):
+        pattern = target if isinstance(target, re.Pattern) else re.compile(target)
+        encoding = None
+    else:
+        pattern = target if isinstance(target, re.Pattern) else compile_bytes_pattern(target)
+    if first:
+        m = pattern.search(source)
+        return [_match_value(m, encoding)] if m else []
+    return [_match_value(m, encoding) for m in pattern.finditer(source)]
+
+
 def try_select(
-    source: Union[str, Tag],
-    target: str,
+    source: Union[str, bytes, memoryview, Tag],
+    target: Union[str, bytes, re.Pattern],
     default: str = '',
     default_factory: Callable = None,
     first: bool = True,
-    post=lambda x: x
+    post=lambda x: x,
+    encoding: str = 'utf-8',
 ) -> any:
-    if isinstance(source, Tag):
+    if isinstance(source, (str, bytes, bytearray, memoryview)):
+        t = regex_select(source, target, first=first, encoding=encoding)
+    elif hasattr(source, 'select'):
+        # a bs4 Tag, checked by duck typing so that bs4 is not imported here
         t = source.select(target)
-    elif isinstance(source, str):
-        t = re.findall(target, source)
     else:
         print("Unsupported source type: %s" % type(source))
         return None
@@ -59,6 +148,15 @@ def try_select(
         return default
 
 
+def try_response_select(res: Response, target: Union[str, bytes, re.Pattern], **kwargs):
+    """Regex select on the raw response body without decoding `res.text`.
+
+    Matches are decoded with the response encoding unless `encoding` is given.
+    """
+    kwargs.setdefault('encoding', res.encoding or 'utf-8')
+    return try_select(res.content, target, **kwargs)
+
+
 def try_soup_select_text(soup, selector: str, **kwargs):
     return try_select(soup, selector, post=lambda x: x.text.strip(), **kwargs)
 
@@ -86,6 +184,7 @@ def with_async_timeit(func):
 
 
 def parse_iso_datetime(dt_string):
+    import dateutil.parser
     return dateutil.parser.isoparse(dt_string).replace(tzinfo=None)
 
 
@@ -132,7 +231,11 @@ sync_hook_to_function = {
 }
 
 
-def create_aclient(logs: list = ['log_res'], sync: bool = False, **kwargs):
+# client keyword arguments that configure the connection pool of its transport
+transport_kwargs = ('verify', 'cert', 'trust_env', 'http1', 'http2', 'limits')
+
+
+def create_aclient(logs: list = ['log_res'], sync: bool = False, proxy_pool: ProxyPool = None, **kwargs):
     """Creates a AsyncClient object with user-agent and even hooks configured.
 
     Parameters:
@@ -141,7 +244,15 @@ def create_aclient(logs: list = ['log_res'], sync: bool = False, **kwargs):
          `log_res` - print status code and url of each response
          `log_res_h` - print the headers of each response
          `log_req_h` - print the headers of each request upon a response
+     - `proxy_pool` (ProxyPool, optional): route the requests through a pool of proxies.
     """
+    from httpx import AsyncClient, Client
+
+    if proxy_pool is not None:
+        # the client only passes these to its default transport, which is replaced here
+        transport_kw = {k: kwargs[k] for k in transport_kwargs if k in kwargs}
+        kwargs['transport'] = proxy_pool.sync_transport(**transport_kw) if sync else proxy_pool.async_transport(**transport_kw)
+
     res_hooks = []
     hook_map = async_hook_to_function if not sync else sync_hook_to_function
 
@@ -0,0 +1,159 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import *
+import asyncio
+
+
+_DONE = object()
+
+
+def _as_list(x):
+    if x is None:
+        return []
+    if isinstance(x, str):
+        return [x]
+    return list(x)
+
+
+@dataclass
+class Stage:
+    """A stage of a workflow.
+
+    Parameters:
+
+     - `name` (str) The name of the stage, used by other stages in `after`.
+     - `scraper` (str | RequestSenderBase) The scraper run on every input of this stage. A
+     string is looked up in the `scrapers` of the module the workflow belongs to. Scrapers
+     of loaded sub-modules can be referred to as `'module_name.scraper_name'`.
+     - `after` (str | list) The upstream stage(s). A stage without upstream stages takes
+     the inputs the workflow is called with.
+     - `expand` (function) A method that takes in an output of an upstream stage and returns
+     an iterable of inputs for this stage. Each input is passed to `scraper.scrape` as its
+     only positional argument. An error in `expand` is printed and the output skipped,
+     like a failed scrape.
+     - `concurrency` (int) The maximum number of in-flight scrapes of this stage.
+     - `collect` (bool) Whether to keep the outputs of this stage in the workflow result.
+     Defaults to collecting the outputs of stages with no downstream stages.
+    """
+
+    name: str
+    scraper: Union[str, Any]
+    after: Union[str, list[str]] = None
+    expand: Callable[[Any], Iterable] = lambda r: [r]
+    concurrency: int = 5
+    collect: bool = None
+
+
+
+
+class Workflow():
+    """A DAG of scrapers connected by queues.
+
+    Every stage has its own queue and pool of `concurrency` workers. As soon as a stage
+    produces an output, it is expanded into inputs for the downstream stages, so a
+    downstream stage starts working on the first item while the upstream stage is still
+    scraping the rest.
+
+    Calling a workflow with a list of inputs returns a coroutine that resolves to a
+    dictionary of stage name -> list of outputs of the collected stages.
+    """
+
+    def __init__(self, module, stages: list[Stage], queue_size: int = 0):
+        self.module = module
+        self.stages = {s.name: s for s in stages}
+        self.queue_size = queue_size
+
+        self.upstream = {s.name: _as_list(s.after) for s in stages}
+        self.downstream = {s.name: [] for s in stages}
+        for s in stages:
+            for u in self.upstream[s.name]:
+                if u not in self.stages:
+                    raise ValueError("Stage '{}' depends on unknown stage '{}'".format(s.name, u))
+                self.downstream[u].append(s)
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visited = {}
+        def visit(name):
+            if visited.get(name) == 1:
+                raise ValueError("Workflow stages form a cycle at '{}'".format(name))
+            if visited.get(name) == 2:
+                return
+            visited[name] = 1
+            for d in self.downstream[name]:
+                visit(d.name)
+            visited[name] = 2
+        for name in self.stages:
+            visit(name)
+
+    def resolve_scraper(self, scraper):
+        if not isinstance(scraper, str):
+            return scraper
+        return self.module.get_scraper(scraper)
+
+    async def __call__(self, inputs: Iterable = (None,)) -> dict[str, list]:
+        queues = {n: asyncio.Queue(self.queue_size) for n in self.stages}
+        open_upstreams = {n: len(u) for n, u in self.upstream.items()}
+        results = {
+            n: [] for n, s in self.stages.items()
+            if s.collect or (s.collect is None and not self.downstream[n])
+        }
+
+        async def close(name):
+            await queues[name].put(_DONE)
+
+        async def run_stage(stage: Stage):
+            q = queues[stage.name]
+            scraper = self.resolve_scraper(stage.scraper)
+            downstream = self.downstream[stage.name]
+            collected = results.get(stage.name)
+
+            async def worker():
+                while True:
+                    item = await q.get()
+                    if item is _DONE:
+                        # let the other workers of this stage see the sentinel
+                        await q.put(_DONE)
+                        return
+                    try:
+                        res = await scraper.scrape(item)
+                    except Exception as e:
+                        print("Stage '{}' failed on {!r}: {}".format(stage.name, item, e))
+                        continue
+                    if res is None:
+                        # nothing to pass on, e.g. an unchanged page in an incremental crawl
+                        continue
+                    if collected is not None:
+                        collected.append(res)
+                    for d in downstream:
+                        try:
+                            inputs = list(d.expand(res))
+                        except Exception as e:
+                            print("Stage '{}' failed to expand {!r}: {}".format(d.name, res, e))
+                            continue
+                        for i in inputs:
+                            await queues[d.name].put(i)
+
+            await asyncio.gather(*[worker() for _ in range(max(stage.concurrency, 1))])
+            for d in downstream:
+                open_upstreams[d.name] -= 1
+                if open_upstreams[d.name] == 0:
+                    await close(d.name)
+
+        async def feed():
+            roots = [n for n, u in self.upstream.items() if not u]
+            for i in inputs:
+                for n in roots:
+                    await queues[n].put(i)
+            for n in roots:
+                await close(n)
+
+        tasks = [asyncio.ensure_future(c) for c in [feed(), *[run_stage(s) for s in self.stages.values()]]]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # an unexpected error (e.g. from the inputs iterable) would leave the other
+            # stages waiting on their queues forever
+            for t in tasks:
+                t.cancel()
+        return results